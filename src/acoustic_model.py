@@ -0,0 +1,133 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+import torch
+from transformers import Wav2Vec2Processor, Wav2Vec2ForCTC, Wav2Vec2CTCTokenizer
+
+from chunked_inference import ChunkedLogits
+from model_bundle import load_pretrained
+
+logger = logging.getLogger(__name__)
+
+
+class ModelBackends:
+    TORCH = "torch"
+    INT8 = "int8"
+    ONNX = "onnx"
+
+
+class AcousticModel(ABC):
+    def __init__(self, processor: Wav2Vec2Processor):
+        self.fs = 16000
+        self.processor = processor
+
+    @property
+    def tokenizer(self) -> Wav2Vec2CTCTokenizer:
+        return self.processor.tokenizer
+
+    @property
+    def normalizes(self) -> bool:
+        return self.processor.feature_extractor.do_normalize
+
+    def _features(self, audio: np.ndarray, return_tensors: str, normalized: bool = False):
+        if normalized:
+            # the processor would normalize again, over this window only
+            input_values = np.asarray(audio, dtype=np.float32)[None, :]
+            return torch.from_numpy(input_values) if return_tensors == 'pt' else input_values
+        return self.processor(audio, sampling_rate=self.fs, return_tensors=return_tensors, padding=True).input_values
+
+    def _batch_inputs(self, audios: List[np.ndarray], return_tensors: str):
+        # zero padded to the longest utterance, each one normalized over its own samples
+        return self.processor(audios, sampling_rate=self.fs, return_tensors=return_tensors, padding=True)
+
+    @staticmethod
+    def _trim(logits: np.ndarray, audios: List[np.ndarray]) -> List[np.ndarray]:
+        return [logits[i, :ChunkedLogits.frame_count(len(audio))] for i, audio in enumerate(audios)]
+
+    @abstractmethod
+    def logits(self, audio: np.ndarray, normalized: bool = False) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def batch_logits(self, audios: List[np.ndarray]) -> List[np.ndarray]:
+        pass
+
+
+class TorchAcousticModel(AcousticModel):
+    def __init__(self, processor: Wav2Vec2Processor, model: Wav2Vec2ForCTC):
+        super().__init__(processor)
+        self.model = model.eval()
+
+    def logits(self, audio: np.ndarray, normalized: bool = False) -> np.ndarray:
+        input_values = self._features(audio, 'pt', normalized)
+        with torch.inference_mode():
+            out = self.model(input_values=input_values)
+        return out.logits.numpy()[0]
+
+    def batch_logits(self, audios: List[np.ndarray]) -> List[np.ndarray]:
+        inputs = self._batch_inputs(audios, 'pt')
+        # models with a group norm feature encoder are trained without an attention mask
+        attention_mask = inputs.get("attention_mask") if self.model.config.feat_extract_norm == "layer" else None
+        with torch.inference_mode():
+            out = self.model(input_values=inputs.input_values, attention_mask=attention_mask)
+        return self._trim(out.logits.numpy(), audios)
+
+
+class QuantizedAcousticModel(TorchAcousticModel):
+    def __init__(self, processor: Wav2Vec2Processor, model: Wav2Vec2ForCTC):
+        quantized = torch.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+        super().__init__(processor, quantized)
+
+
+class OnnxAcousticModel(AcousticModel):
+    def __init__(self, processor: Wav2Vec2Processor, onnx_path: str, threads: int = 0):
+        import onnxruntime
+
+        super().__init__(processor)
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+
+    @staticmethod
+    def export(model: Wav2Vec2ForCTC, onnx_path: str):
+        logger.info(f"exporting model to {onnx_path}")
+        os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+        dummy_input = torch.zeros((1, 16000), dtype=torch.float32)
+        torch.onnx.export(
+            model.eval(),
+            dummy_input,
+            onnx_path,
+            input_names=["input_values"],
+            output_names=["logits"],
+            dynamic_axes={"input_values": {0: "batch", 1: "samples"}, "logits": {0: "batch", 1: "frames"}},
+            opset_version=14
+        )
+
+    def logits(self, audio: np.ndarray, normalized: bool = False) -> np.ndarray:
+        input_values = self._features(audio, 'np', normalized).astype(np.float32)
+        return self.session.run(["logits"], {"input_values": input_values})[0][0]
+
+    def batch_logits(self, audios: List[np.ndarray]) -> List[np.ndarray]:
+        input_values = self._batch_inputs(audios, 'np').input_values.astype(np.float32)
+        return self._trim(self.session.run(["logits"], {"input_values": input_values})[0], audios)
+
+
+def build_acoustic_model(model_name: str, backend: str, models_dir: str, threads: int = 0) -> AcousticModel:
+    # threads limits intra-op parallelism, 0 keeps the library default of one thread per core
+    if threads:
+        torch.set_num_threads(threads)
+    if backend == ModelBackends.ONNX:
+        onnx_path = os.path.join(models_dir, model_name.replace("/", "--") + ".onnx")
+        processor, model = load_pretrained(model_name, models_dir, load_model=not os.path.exists(onnx_path))
+        if model is not None:
+            OnnxAcousticModel.export(model, onnx_path)
+        return OnnxAcousticModel(processor, onnx_path, threads)
+    processor, model = load_pretrained(model_name, models_dir)
+    if backend == ModelBackends.TORCH:
+        return TorchAcousticModel(processor, model)
+    if backend == ModelBackends.INT8:
+        return QuantizedAcousticModel(processor, model)
+    raise RuntimeError(f"model backend \"{backend}\" not supported!")
@@ -0,0 +1,46 @@
+from typing import Optional
+
+import numpy as np
+
+
+class AudioBuffer:
+    def __init__(self, capacity: int, channels: int = 1, data: Optional[np.ndarray] = None):
+        # data backs the buffer in place, e.g. a shared memory slot of the inference worker
+        self.capacity = capacity
+        if data is None:
+            self._data = np.zeros((capacity, channels), dtype=np.float32)
+        else:
+            self._data = data[:capacity * channels].reshape(capacity, channels)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self._size
+
+    @property
+    def full(self) -> bool:
+        return self._size >= self.capacity
+
+    def clear(self):
+        self._size = 0
+
+    def reserve(self, length: int) -> np.ndarray:
+        # writable slot for e.g. sd.rec(out=...), committed with commit()
+        length = min(length, self.free)
+        return self._data[self._size:self._size + length]
+
+    def commit(self, length: int):
+        self._size = min(self._size + length, self.capacity)
+
+    def write(self, samples: np.ndarray) -> int:
+        length = min(len(samples), self.free)
+        self._data[self._size:self._size + length] = samples[:length]
+        self._size += length
+        return length
+
+    def view(self, start: int = 0, end: int = None) -> np.ndarray:
+        end = self._size if end is None else min(end, self._size)
+        return self._data[start:end, 0]
@@ -0,0 +1,154 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+from dataclasses import dataclass
+from timeit import default_timer
+from typing import Iterator, List, Optional, TextIO
+
+import numpy as np
+import wavio
+
+from inference_worker import build_speech_models
+from language_decoder_builder import DecoderTypes
+from utils import configure_logging, get_config, get_data_dir
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+FS = 16000
+
+# inherited by the forked decoding processes, the decoders are not cheap to pickle
+_decoder = None
+
+
+@dataclass
+class Sample:
+    path: str
+    reference: Optional[str] = None
+    audio: Optional[np.ndarray] = None
+
+
+def read_samples(source: str) -> List[Sample]:
+    # a directory of .wav files with optional .txt transcripts next to them,
+    # or a JSON lines manifest {"audio": path, "text": reference}
+    if os.path.isdir(source):
+        samples = []
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if not name.lower().endswith(".wav"):
+                    continue
+                path = os.path.join(root, name)
+                reference_path = os.path.splitext(path)[0] + ".txt"
+                reference = None
+                if os.path.exists(reference_path):
+                    with open(reference_path, "r", encoding="utf-8") as f:
+                        reference = f.read().strip()
+                samples.append(Sample(path, reference))
+        return samples
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    return [Sample(os.path.join(base_dir, entry["audio"]), entry.get("text")) for entry in entries]
+
+
+def load_audio(path: str) -> np.ndarray:
+    wav = wavio.read(path)
+    data = wav.data.astype(np.float32)
+    if wav.sampwidth == 1:
+        data = (data - 128) / 128
+    else:
+        data /= 2 ** (8 * wav.sampwidth - 1)
+    audio = data.mean(axis=1)
+    if wav.rate != FS:
+        # linear interpolation is enough for evaluation, record the corpus at 16 kHz for exact results
+        positions = np.arange(int(len(audio) * FS / wav.rate)) * (wav.rate / FS)
+        audio = np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+    return audio
+
+
+def batches(samples: List[Sample], batch_size: int) -> Iterator[List[Sample]]:
+    # similar lengths in one batch keep the padding small
+    for start in range(0, len(samples), batch_size):
+        batch = samples[start:start + batch_size]
+        for sample in batch:
+            sample.audio = load_audio(sample.path)
+        yield batch
+
+
+def _decode_grammar(logits: np.ndarray):
+    return _decoder.decode_scored(logits)
+
+
+def transcribe(config: dict, source: str, out: TextIO, batch_size: int, workers: int, beam_width: int):
+    global _decoder
+    samples = read_samples(source)
+    samples.sort(key=lambda sample: os.path.getsize(sample.path))
+    logger.info(f"{len(samples)} nagrań")
+    acoustic_model, _decoder = build_speech_models(config, os.path.join(get_data_dir(), "commands"))
+    grammar = config["decoder"] == DecoderTypes.GRAMMAR
+
+    references, hypotheses = [], []
+    audio_time = 0.0
+    start = default_timer()
+    # fork after the decoder is built, pyctcdecode's decode_batch falls back to one process otherwise
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        for batch in batches(samples, batch_size):
+            logits = acoustic_model.batch_logits([sample.audio for sample in batch])
+            if grammar:
+                results = pool.map(_decode_grammar, logits)
+            else:
+                results = [(text, None) for text in _decoder.decode_batch(pool, logits, beam_width=beam_width)]
+            for sample, (text, confidence) in zip(batch, results):
+                duration = len(sample.audio) / FS
+                audio_time += duration
+                record = {"audio": sample.path, "text": text, "duration": round(duration, 3)}
+                if confidence is not None:
+                    record["confidence"] = round(confidence, 4)
+                if sample.reference is not None:
+                    record["reference"] = sample.reference
+                    references.append(sample.reference)
+                    hypotheses.append(text)
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                sample.audio = None
+            out.flush()
+    elapsed = default_timer() - start
+    logger.info(f"{audio_time:.1f}s nagrań w {elapsed:.1f}s, {audio_time / max(elapsed, 1e-9):.1f}x czasu rzeczywistego")
+    if references:
+        import jiwer
+
+        exact = sum(reference == hypothesis for reference, hypothesis in zip(references, hypotheses))
+        logger.info(f"WER: {jiwer.wer(references, hypotheses):.4f}, "
+                    f"poprawne komendy: {exact}/{len(references)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="rozpoznawanie komend z plików WAV")
+    parser.add_argument("source", help="folder z plikami .wav (opcjonalnie .txt z transkrypcją obok) "
+                                       "albo manifest JSON lines {\"audio\": ścieżka, \"text\": transkrypcja}")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--output", help="plik wynikowy JSON lines, domyślnie stdout")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--decoder", choices=["beam", "grammar"])
+    parser.add_argument("--alpha", type=float)
+    parser.add_argument("--beta", type=float)
+    parser.add_argument("--beam-width", type=int, default=100)
+    parser.add_argument("--min-confidence", type=float)
+    args = parser.parse_args()
+
+    config = get_config(args.config)
+    overrides = {
+        "decoder": args.decoder,
+        "decoder_alpha": args.alpha,
+        "decoder_beta": args.beta,
+        "grammar_min_confidence": args.min_confidence
+    }
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            transcribe(config, args.source, output, args.batch_size, args.workers, args.beam_width)
+    else:
+        transcribe(config, args.source, sys.stdout, args.batch_size, args.workers, args.beam_width)
@@ -0,0 +1,39 @@
+import argparse
+import os
+
+import numpy as np
+
+from batch_transcribe import load_audio
+from chunked_inference import ChunkedLogits
+from inference_worker import build_speech_models
+from utils import get_config, get_data_dir
+
+
+def main(paths, config: dict):
+    acoustic_model, decoder = build_speech_models(config, os.path.join(get_data_dir(), "commands"))
+    chunked = ChunkedLogits.for_model(acoustic_model, config["inference_chunk_time"], config["inference_context_time"])
+    same_texts = 0
+    for path in paths:
+        audio = load_audio(path)
+        full = acoustic_model.logits(audio)
+        chunked.reset()
+        # the recorder feeds the growing buffer every frame, one feed per chunk gives the same windows
+        for end in range(chunked.chunk_len, len(audio), chunked.chunk_len):
+            chunked.feed(audio[:end])
+        chunked.feed(audio, final=True)
+        stitched = chunked.logits()
+        difference = np.abs(full - stitched)
+        agreement = np.mean(full.argmax(axis=1) == stitched.argmax(axis=1))
+        full_text, stitched_text = decoder.decode(full), decoder.decode(stitched)
+        same_texts += full_text == stitched_text
+        print(f"{path}: {len(full)} ramek, różnica max {difference.max():.3f} średnio {difference.mean():.4f}, "
+              f"zgodność argmax {agreement:.1%}, \"{full_text}\" / \"{stitched_text}\"")
+    print(f"te same komendy: {same_texts}/{len(paths)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="porównuje logity z fragmentów z logitami z całego nagrania")
+    parser.add_argument("wav", nargs="+")
+    parser.add_argument("--config", default="config.json")
+    args = parser.parse_args()
+    main(args.wav, get_config(args.config))
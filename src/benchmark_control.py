@@ -0,0 +1,71 @@
+import argparse
+from timeit import default_timer
+
+import numpy as np
+
+from fan_controller.curve import CurveController, build_curves_from_config
+from fan_controller.fan import build_fans_from_config
+from fan_controller.simulator import MockRegisterList
+from fan_controller.telemetry import TelemetrySampler
+from utils import get_config
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self) -> float:
+        return self.time
+
+
+def main(duration: float, curve: str, error_rate: float, latency: float):
+    config = get_config("mock_config.json")
+    config["simulation"].update(error_rate=error_rate, latency=latency)
+    clock = SimulatedClock()
+    register_list = MockRegisterList(config, clock=clock)
+    fans = build_fans_from_config(config, register_list)
+    telemetry_sampler = TelemetrySampler(register_list, fans, rate=config["telemetry_rate"], clock=clock)
+    curve_controller = CurveController(
+        register_list, fans, build_curves_from_config(config), rate=config["control_rate"], clock=clock
+    )
+    for fan in fans:
+        curve_controller.set_curve(fan, curve)
+
+    # both loops are stepped on simulated time, as fast as the host allows
+    tasks = [telemetry_sampler, curve_controller]
+    next_ticks = [0.0, 0.0]
+    tick_times = {task.name: [] for task in tasks}
+    failures = 0
+    temperatures = {fan.name: [] for fan in fans}
+    while clock.time < duration:
+        i = int(np.argmin(next_ticks))
+        clock.time = next_ticks[i]
+        task = tasks[i]
+        start = default_timer()
+        try:
+            task.tick()
+        except OSError:
+            failures += 1
+        tick_times[task.name].append(default_timer() - start)
+        next_ticks[i] += task.interval
+        if task is telemetry_sampler and telemetry_sampler.snapshot is not None:
+            for name, state in telemetry_sampler.snapshot.fans.items():
+                temperatures[name].append(state.temperature)
+
+    print(f"{duration:.0f} s symulacji, krzywa \"{curve}\"")
+    for name, values in temperatures.items():
+        values = np.asarray(values[len(values) // 4:])
+        print(f"{name}: temperatura min {values.min()}, max {values.max()}, średnio {values.mean():.1f}")
+    for name, times in tick_times.items():
+        print(f"{name}: {np.mean(times) * 1e6:.1f} µs/krok, max {np.max(times) * 1e6:.1f} µs")
+    print(f"zapisy EC: {register_list.write_stats}, błędy: {register_list.errors}, nieudane kroki: {failures}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="soak test pętli sterowania na symulowanym EC")
+    parser.add_argument("--duration", type=float, default=3600.0, help="czas symulacji w sekundach")
+    parser.add_argument("--curve", default="cicha")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="prawdopodobieństwo błędu transakcji EC")
+    parser.add_argument("--latency", type=float, default=0.0, help="opóźnienie na bajt EC w sekundach")
+    args = parser.parse_args()
+    main(args.duration, args.curve, args.error_rate, args.latency)
@@ -0,0 +1,33 @@
+import json
+import os
+from timeit import default_timer, timeit
+
+from fan_controller.fan import build_fans_from_config
+from fan_controller.simulator import MockRegisterList
+from fan_controller.view import ViewController
+from utils import get_data_dir
+
+
+def main(frames: int = 200, width: int = 200):
+    with open(os.path.join(get_data_dir(), "mock_config.json"), "r") as f:
+        config = json.load(f)
+    register_list = MockRegisterList(config)
+    fans = build_fans_from_config(config, register_list)
+    start = default_timer()
+    for fan in fans:
+        for i in range(fan.history_length):
+            for read_register in fan.read_registers:
+                register_list.write_register(i % 256, read_register.address)
+            fan.sample(start + i)
+    view_controller = ViewController(width=width)
+
+    def render():
+        return "".join(view_controller.get_fan_representation(fan) for fan in fans)
+
+    frame_time = timeit(render, number=frames) / frames
+    print(f"{len(fans)} wiatraki, historia {fans[0].history_length} próbek, szerokość {width}: "
+          f"{frame_time * 1000:.3f} ms/klatkę")
+
+
+if __name__ == "__main__":
+    main()
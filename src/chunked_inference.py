@@ -0,0 +1,89 @@
+import logging
+from typing import Callable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkedLogits:
+    # wav2vec2 feature encoder: one logit frame per 320 samples, 400 samples receptive field
+    FRAME_STRIDE = 320
+    RECEPTIVE_FIELD = 400
+
+    def __init__(self, infer: Callable[[np.ndarray], np.ndarray], chunk_len: int, context_len: int,
+                 normalize: bool = True):
+        # infer gets windows ready for the model, with normalize they are scaled here, not per window
+        self.infer = infer
+        self.chunk_len = max(1, chunk_len // self.FRAME_STRIDE) * self.FRAME_STRIDE
+        self.context_len = (context_len // self.FRAME_STRIDE) * self.FRAME_STRIDE
+        self.normalize = normalize
+        self._frames: List[np.ndarray] = []
+        self._done_frames = 0
+        self._stats_len = 0
+        self._sum = 0.0
+        self._square_sum = 0.0
+
+    @classmethod
+    def for_model(cls, acoustic_model, chunk_time: float, context_time: float):
+        return cls(
+            lambda audio: acoustic_model.logits(audio, normalized=True),
+            chunk_len=int(chunk_time * acoustic_model.fs),
+            context_len=int(context_time * acoustic_model.fs),
+            normalize=acoustic_model.normalizes
+        )
+
+    def reset(self):
+        self._frames = []
+        self._done_frames = 0
+        self._stats_len = 0
+        self._sum = 0.0
+        self._square_sum = 0.0
+
+    def _normalized(self, audio: np.ndarray, start: int, end: int) -> np.ndarray:
+        # wav2vec2 expects zero mean and unit variance over the utterance, a window that is mostly room noise
+        # would be scaled up on its own, so the statistics cover all audio received so far
+        window = audio[start:end]
+        if not self.normalize:
+            return window
+        if end > self._stats_len:
+            new = audio[self._stats_len:end].astype(np.float64)
+            self._sum += float(new.sum())
+            self._square_sum += float(np.dot(new, new))
+            self._stats_len = end
+        mean = self._sum / self._stats_len
+        variance = max(self._square_sum / self._stats_len - mean * mean, 0.0)
+        return ((window - mean) / np.sqrt(variance + 1e-7)).astype(np.float32)
+
+    @classmethod
+    def frame_count(cls, audio_len: int) -> int:
+        if audio_len < cls.RECEPTIVE_FIELD:
+            return 0
+        return (audio_len - cls.RECEPTIVE_FIELD) // cls.FRAME_STRIDE + 1
+
+    def feed(self, audio: np.ndarray, final: bool = False):
+        # every window gets context_len of audio on both sides, only its middle chunk_len is kept
+        while True:
+            done = self._done_frames * self.FRAME_STRIDE
+            remaining = len(audio) - done
+            last_window = remaining <= self.chunk_len + self.context_len
+            if last_window and not final:
+                return
+            if final and self._done_frames >= self.frame_count(len(audio)):
+                return
+            start = max(0, done - self.context_len)
+            end = len(audio) if last_window else done + self.chunk_len + self.context_len
+            logits = self.infer(self._normalized(audio, start, end))
+            first = self._done_frames - start // self.FRAME_STRIDE
+            last = len(logits) if last_window else first + self.chunk_len // self.FRAME_STRIDE
+            piece = logits[first:last]
+            logger.debug(f"chunk {start}-{end}: {len(piece)} frames")
+            self._frames.append(piece)
+            self._done_frames += len(piece)
+            if last_window:
+                return
+
+    def logits(self) -> Optional[np.ndarray]:
+        if not self._frames:
+            return None
+        return np.concatenate(self._frames)
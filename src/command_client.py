@@ -0,0 +1,32 @@
+import argparse
+import json
+import socket
+import sys
+
+from utils import get_config
+
+
+def main(path: str) -> bool:
+    # every line from stdin is one request, all of them are sent as one batch
+    lines = [line.strip() for line in sys.stdin if line.strip()]
+    ok = True
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall("".join(line + "\n" for line in lines).encode())
+        with client.makefile("r", encoding="utf-8") as responses:
+            for _ in lines:
+                response = responses.readline()
+                if not response:
+                    break
+                print(response, end="")
+                ok = ok and json.loads(response)["ok"]
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="wysyła komendy JSON lines ze stdin do serwera komend")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--socket", help="ścieżka gniazda, domyślnie \"command_socket\" z konfiguracji")
+    args = parser.parse_args()
+    if not main(args.socket or get_config(args.config)["command_socket"]):
+        sys.exit(1)
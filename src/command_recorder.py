@@ -1,15 +1,49 @@
 import logging
+import queue
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Optional, Union
 
 import sounddevice as sd
 from timeit import default_timer
 import numpy as np
-from pyctcdecode import BeamSearchDecoderCTC
-from transformers import Wav2Vec2Processor, Wav2Vec2ForCTC
+
+from audio_buffer import AudioBuffer
+from chunked_inference import ChunkedLogits
+from grammar_decoder import GrammarDecoder
+from inference_worker import InferenceWorker, warm_up
+
+if TYPE_CHECKING:
+    # torch stays out of the control process when inference runs in the worker
+    from pyctcdecode import BeamSearchDecoderCTC
+    from acoustic_model import AcousticModel
 
 logger = logging.getLogger(__name__)
 
 
+class RecordModes:
+    BLOCKING = "blocking"
+    STREAM = "stream"
+
+
+@dataclass
+class Utterance:
+    audio: np.ndarray
+    logits: Optional[np.ndarray] = None
+    # index of the recorder buffer holding the audio, the inference worker reads it in place
+    slot: int = 0
+
+
 class CommandRecorder:
+    FS = 16000
+    # captures rotate through the buffers, one is being recorded, one waits for inference and one is recognized,
+    # so an utterance is never copied out of its buffer
+    BUFFERS = 3
+    FRAME_TIME = 0.02
+    # lowest noise floor in dBFS, keeps digital silence from making every frame voiced
+    MIN_NOISE_DB = -70.0
+    # how fast the noise floor follows unvoiced frames
+    NOISE_ADAPT = 0.05
 
     def __init__(
             self,
@@ -17,43 +51,181 @@ class CommandRecorder:
             record_wait_time: int,
             initial_record_wait_time: int,
             max_command_time: int,
-            decoder: BeamSearchDecoderCTC,
-            processor: Wav2Vec2Processor,
-            model: Wav2Vec2ForCTC
+            decoder: Optional[Union["BeamSearchDecoderCTC", GrammarDecoder]] = None,
+            acoustic_model: Optional["AcousticModel"] = None,
+            inference_worker: Optional[InferenceWorker] = None,
+            record_mode: str = RecordModes.STREAM,
+            silence_time: float = 0.2,
+            vad_threshold_db: float = 12.0,
+            noise_floor_time: float = 0.2,
+            incremental_inference: bool = False,
+            inference_chunk_time: float = 1.0,
+            inference_context_time: float = 0.5,
+            on_status: Callable[[str], None] = print
 
     ):
-        self.fs = 16000
+        self.fs = self.FS
         self.volume_threshold = volume_threshold
         self.record_wait_time = record_wait_time
         self.initial_record_wait_time = initial_record_wait_time
         self.max_command_time = max_command_time
         self.decoder = decoder
-        self.processor = processor
-        self.model = model
+        self.acoustic_model = acoustic_model
+        self.inference_worker = inference_worker
+        self.record_mode = record_mode
+        self.silence_time = silence_time
+        self.vad_threshold_db = vad_threshold_db
+        self.noise_floor_time = noise_floor_time
+        # measured once and tracked across captures, the next capture may start while the user already speaks
+        self.noise_floor: Optional[float] = None
+        if inference_worker is not None:
+            self.audio_buffers = [
+                AudioBuffer(inference_worker.capacity, data=inference_worker.slot(i))
+                for i in range(inference_worker.slots)
+            ]
+        else:
+            self.audio_buffers = [AudioBuffer(int(max_command_time * self.fs)) for _ in range(self.BUFFERS)]
+        self._slot = 0
+        self.audio_buffer = self.audio_buffers[0]
+        self.on_status = on_status
+        self._cancelled = threading.Event()
+        self.chunked_logits: Optional[ChunkedLogits] = None
+        # with the worker the chunks are recognized in the worker process, straight from the shared slot
+        if incremental_inference and acoustic_model is not None:
+            self.chunked_logits = ChunkedLogits.for_model(acoustic_model, inference_chunk_time, inference_context_time)
+        self.worker_chunks = incremental_inference and inference_worker is not None
 
     def _record_command(self):
         total_time = 0
         max_volume = 1.0
-        total_audio = np.array([[0.]])
+        self.audio_buffer.clear()
         record_wait_time = self.initial_record_wait_time
-        print("nagrywanie komendy...")
+        self.on_status("nagrywanie komendy...")
         start = default_timer()
-        while max_volume > self.volume_threshold and total_time < self.max_command_time:
-            command_slice = sd.rec(int(record_wait_time * self.fs), samplerate=self.fs, channels=1)
+        while max_volume > self.volume_threshold and total_time < self.max_command_time and not self.audio_buffer.full \
+                and not self._cancelled.is_set():
+            command_slice = self.audio_buffer.reserve(int(record_wait_time * self.fs))
+            sd.rec(samplerate=self.fs, out=command_slice)
             sd.wait()
-            total_audio = np.concatenate((total_audio, command_slice))
+            self.audio_buffer.commit(len(command_slice))
             max_volume = command_slice.max()
             logger.info(f"max: {max_volume} / {self.volume_threshold}")
             total_time += self.record_wait_time
             record_wait_time = self.record_wait_time
             logger.info(f"czas trwania: {total_time:2}s")
-        print(f"koniec nagrywania! {(default_timer()-start):2}s")
-        total_audio = np.reshape(total_audio, total_audio.shape[0])
-        return total_audio
+        self.on_status(f"koniec nagrywania! {(default_timer()-start):.2f}s")
+        return self.audio_buffer.view()
 
-    def record_command(self):
-        command_audio = self._record_command()
-        feats = self.processor(command_audio, sampling_rate=self.fs, return_tensors='pt', padding=True)
-        out = self.model(input_values=feats.input_values)
-        sent = self.decoder.decode(out.logits.cpu().detach().numpy()[0])
+    def _stream_command(self):
+        # a frame is voiced when its RMS energy is vad_threshold_db above the noise floor measured over
+        # the first noise_floor_time of the first capture, initial_record_wait_time bounds the wait for speech,
+        # silence_time of unvoiced frames (hangover) ends the command and max_command_time caps it
+        frame_len = int(self.FRAME_TIME * self.fs)
+        initial_len = int(self.initial_record_wait_time * self.fs)
+        silence_frames = max(1, int(self.silence_time / self.FRAME_TIME))
+        calibration_frames = max(1, int(self.noise_floor_time / self.FRAME_TIME))
+        # the callback writes samples in place, only frame energies cross threads
+        levels: "queue.Queue[Optional[float]]" = queue.Queue()
+        buffer = self.audio_buffer
+        buffer.clear()
+        chunked = self.chunked_logits
+        if chunked:
+            chunked.reset()
+
+        def callback(indata, frame_count, time_info, status):
+            if status:
+                logger.warning(status)
+            written = buffer.write(indata)
+            if not written:
+                levels.put(None)
+                return
+            rms = float(np.sqrt(np.mean(np.square(indata[:written]))))
+            levels.put(20 * np.log10(max(rms, 1e-10)))
+
+        noise_levels = []
+        noise_floor = self.noise_floor if self.noise_floor is not None else self.MIN_NOISE_DB
+        speech_started = False
+        silent_frames = 0
+        self.on_status("nagrywanie komendy...")
+        start = default_timer()
+        with sd.InputStream(samplerate=self.fs, channels=1, dtype='float32', blocksize=frame_len, callback=callback):
+            while True:
+                level = levels.get()
+                if level is None or buffer.full or self._cancelled.is_set():
+                    break
+                if self.noise_floor is None:
+                    noise_levels.append(level)
+                    noise_floor = max(float(np.median(noise_levels)), self.MIN_NOISE_DB)
+                    if len(noise_levels) >= calibration_frames:
+                        self.noise_floor = noise_floor
+                    continue
+                voiced = level > noise_floor + self.vad_threshold_db
+                if voiced:
+                    speech_started = True
+                    silent_frames = 0
+                else:
+                    noise_floor = max(noise_floor + self.NOISE_ADAPT * (level - noise_floor), self.MIN_NOISE_DB)
+                    if speech_started:
+                        silent_frames += 1
+                        if silent_frames >= silence_frames:
+                            break
+                    elif len(buffer) >= initial_len:
+                        break
+                if chunked and speech_started:
+                    # runs while the callback keeps filling the buffer, queued levels are caught up afterwards
+                    chunked.feed(buffer.view())
+                elif self.worker_chunks and speech_started:
+                    self.inference_worker.feed(self._slot, len(buffer))
+        if self.noise_floor is not None:
+            self.noise_floor = noise_floor
+        self.on_status(f"koniec nagrywania! {(default_timer()-start):.2f}s")
+        if not speech_started or self._cancelled.is_set():
+            logger.info("nie wykryto mowy")
+            return Utterance(buffer.view(0, 0))
+        if chunked:
+            chunked.feed(buffer.view(), final=True)
+            return Utterance(buffer.view(), chunked.logits())
+        return Utterance(buffer.view())
+
+    def cancel(self):
+        # ends a capture in progress, used on shutdown
+        self._cancelled.set()
+        if self.record_mode == RecordModes.BLOCKING:
+            sd.stop()
+
+    def capture(self) -> Utterance:
+        self._slot = (self._slot + 1) % len(self.audio_buffers)
+        self.audio_buffer = self.audio_buffers[self._slot]
+        if self.worker_chunks:
+            self.inference_worker.reset(self._slot)
+        if self.record_mode == RecordModes.STREAM:
+            utterance = self._stream_command()
+        else:
+            utterance = Utterance(self._record_command())
+        utterance.slot = self._slot
+        return utterance
+
+    def transcribe(self, utterance: Utterance) -> str:
+        if utterance.audio.size == 0:
+            return ""
+        if self.inference_worker is not None:
+            sent, timings = self.inference_worker.transcribe(utterance.slot, len(utterance.audio))
+            logger.info("czas rozpoznawania po nagraniu: " + ", ".join(f"{k} {v:.3f}s" for k, v in timings.items()))
+            return sent
+        start = default_timer()
+        logits = utterance.logits if utterance.logits is not None else self.acoustic_model.logits(utterance.audio)
+        sent = self.decoder.decode(logits)
+        logger.info(f"czas rozpoznawania po nagraniu: {(default_timer()-start):.3f}s")
         return sent
+
+    def warm_up(self):
+        # the worker warms up on its own before reporting ready
+        if self.inference_worker is None:
+            warm_up(self.acoustic_model, self.decoder)
+
+    def close(self):
+        if self.inference_worker is not None:
+            self.inference_worker.close()
+
+    def record_command(self):
+        return self.transcribe(self.capture())
@@ -0,0 +1,91 @@
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass
+class Command:
+    name: str
+    args: List[str]
+
+
+@dataclass
+class Setting:
+    action: str
+    value: Optional[float] = None
+
+
+def read_commands(commands_dir: str) -> List[Command]:
+    path = os.path.join(commands_dir, "commands.txt")
+    with open(path, "r") as f:
+        lines = f.readlines()
+    commands: List[Command] = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        command_words_list = line.split(" ")
+        name = command_words_list[0]
+        args = command_words_list[1:]
+        commands.append(Command(name, args))
+    return commands
+
+
+def read_arg_values(commands_dir: str, arg_name: str) -> List[str]:
+    path = os.path.join(commands_dir, arg_name) + ".txt"
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def _check_same(kind: str, listed: List[str], mapped: Dict[str, Any]):
+    # the recognizer only produces listed words, every one of them needs a meaning and the other way round
+    unmapped = [word for word in listed if word not in mapped]
+    unlisted = [word for word in mapped if word not in listed]
+    if unmapped:
+        raise ValueError(f"{kind} missing in actions.json: {', '.join(unmapped)}!")
+    if unlisted:
+        raise ValueError(f"{kind} in actions.json but not in the commands files: {', '.join(unlisted)}!")
+
+
+class CommandRegistry:
+    @classmethod
+    def from_dir(cls, commands_dir: str):
+        with open(os.path.join(commands_dir, "actions.json"), "r") as f:
+            actions = json.load(f)
+        commands = read_commands(commands_dir)
+        handlers, arguments = actions["commands"], actions["arguments"]
+        _check_same("commands", [command.name for command in commands], handlers)
+        arg_names = list(dict.fromkeys(arg for command in commands for arg in command.args))
+        _check_same("arguments", arg_names, arguments)
+        for arg_name in arg_names:
+            _check_same(f"{arg_name} values", read_arg_values(commands_dir, arg_name), arguments[arg_name])
+        return cls(commands, handlers, arguments)
+
+    def __init__(self, commands: List[Command], handlers: Dict[str, str], arguments: Dict[str, Dict[str, Any]]):
+        self.commands: Dict[str, Command] = {command.name: command for command in commands}
+        self.handlers = handlers
+        # argument values resolved once, dicts become Setting objects
+        self.arguments: Dict[str, Dict[str, Any]] = {
+            arg_name: {
+                word: Setting(**value) if isinstance(value, dict) else value
+                for word, value in values.items()
+            }
+            for arg_name, values in arguments.items()
+        }
+
+    def parse(self, text: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        words = text.split()
+        if not words or words[0] not in self.commands:
+            return None
+        command = self.commands[words[0]]
+        values = words[1:]
+        if len(values) != len(command.args):
+            raise ValueError(f"wrong argument amount for \"{command.name}\"!")
+        args = {}
+        for arg_name, value in zip(command.args, values):
+            lookup = self.arguments[arg_name]
+            if value not in lookup:
+                raise ValueError(f"unknown {arg_name} \"{value}\"!")
+            args[arg_name] = lookup[value]
+        return self.handlers[command.name], args
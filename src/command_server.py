@@ -0,0 +1,163 @@
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional
+
+from command_registry import Setting
+
+logger = logging.getLogger(__name__)
+
+Request = Dict[str, Any]
+Response = Dict[str, Any]
+
+
+class CommandServer:
+    # JSON lines over a Unix socket, one response line per request line, in order:
+    #   {"id": 1, "command": "ustaw procesor sto"}
+    #   {"id": 2, "fan": "CPU", "speed": 0.5} / {"fan": "*", "mode": "auto"} / {"fan": "GPU", "curve": "cicha"}
+    #   {"id": 3, "query": "telemetry"}
+    # lines that arrive together form a batch, its register writes go out in one EC flush
+    MAX_LINE = 64 * 1024
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, controller, path: str, executor: Executor, on_exit: Callable[[], None]):
+        self.controller = controller
+        self.path = path
+        # a batch waits for a spoken command under the controller's command lock,
+        # not for the manual prompt, which only blocks the spoken command executor
+        self.executor = executor
+        self.on_exit = on_exit
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_unix_server(self._serve_client, path=self.path)
+        os.chmod(self.path, 0o600)
+        logger.info(f"serwer komend: {self.path}")
+
+    async def close(self):
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    @staticmethod
+    def _error(request: Any, message: str) -> Response:
+        response: Response = {"ok": False, "error": message}
+        if isinstance(request, dict) and "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    def telemetry(self) -> Response:
+        controller = self.controller
+        snapshot = controller.telemetry_sampler.snapshot
+        fans = {}
+        for fan in controller.fans:
+            state = snapshot.get(fan.name) if snapshot is not None else None
+            fans[fan.name] = {
+                "temperature": state.temperature if state else None,
+                "speeds": list(state.speeds) if state else None,
+                "speed_level": state.speed_level if state else None,
+                "curve": controller.curve_controller.curve_name(fan)
+            }
+        return {
+            "timestamp": snapshot.timestamp if snapshot is not None else None,
+            "fans": fans,
+            "writes": controller.register_list.write_stats
+        }
+
+    def _apply(self, request: Request) -> Response:
+        controller = self.controller
+        if "command" in request:
+            parsed = controller.command_registry.parse(request["command"])
+            if parsed is None:
+                raise ValueError(f"unknown command \"{request['command']}\"!")
+            handler, args = parsed
+            if handler == "manual":
+                raise ValueError("manual input is not available over the socket!")
+            controller.command_handlers[handler](**args)
+            return {}
+        if request.get("query") == "telemetry":
+            return self.telemetry()
+        if "fan" in request:
+            target = request["fan"]
+            if "speed" in request:
+                speed = float(request["speed"])
+                if not 0.0 <= speed <= 1.0:
+                    raise ValueError(f"speed {speed} out of range 0-1!")
+                controller.set_command_handler(target, Setting("speed", speed))
+            elif request.get("mode") == "auto":
+                controller.set_command_handler(target, Setting("auto"))
+            elif "curve" in request:
+                controller.curve_command_handler(target, request["curve"])
+            else:
+                raise ValueError("expected \"speed\", \"mode\": \"auto\" or \"curve\"!")
+            return {}
+        raise ValueError("expected \"command\", \"fan\" or \"query\"!")
+
+    def _respond(self, request: Any) -> Response:
+        if not isinstance(request, dict):
+            return self._error(request, "request must be a JSON object!")
+        try:
+            response = self._apply(request)
+        except (ValueError, RuntimeError, TypeError) as e:
+            return self._error(request, str(e))
+        response["ok"] = True
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    def execute_batch(self, requests: List[Any]) -> List[Response]:
+        controller = self.controller
+        try:
+            with controller.command_lock, controller.register_list.batch():
+                responses = [self._respond(request) for request in requests]
+        except OSError as e:
+            # unflushed writes stay dirty and go out with the next flush
+            logger.exception("błąd zapisu do EC")
+            return [self._error(request, f"EC write failed: {e}") for request in requests]
+        return responses
+
+    @staticmethod
+    def _decode(line: bytes) -> Any:
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    async def _execute(self, lines: List[bytes]) -> List[Response]:
+        requests = [self._decode(line) for line in lines]
+        if all(isinstance(r, dict) and set(r) <= {"id", "query"} and "query" in r for r in requests):
+            # read only batches are answered from the snapshot without waiting for commands
+            return [self._respond(request) for request in requests]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.execute_batch, requests)
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        pending = b""
+        try:
+            while True:
+                data = await reader.read(self.READ_SIZE)
+                if not data:
+                    break
+                pending += data
+                *lines, pending = pending.split(b"\n")
+                if len(pending) > self.MAX_LINE:
+                    writer.write(json.dumps(self._error(None, "line too long!")).encode() + b"\n")
+                    break
+                lines = [line for line in lines if line.strip()]
+                if not lines:
+                    continue
+                responses = await self._execute(lines)
+                writer.write(b"".join(json.dumps(r, ensure_ascii=False).encode() + b"\n" for r in responses))
+                await writer.drain()
+                if self.controller.shutdown_requested.is_set():
+                    # the exit command is answered before the runtime stops
+                    self.on_exit()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
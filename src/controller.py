@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import select
+import sys
+import threading
+from typing import Callable, Dict, List, Optional
+
+from command_recorder import CommandRecorder
+from command_registry import CommandRegistry, Setting
+from fan_controller.curve import CurveController, build_curves_from_config
+from fan_controller.dashboard import Dashboard
+from fan_controller.fan import build_fans_from_config, Fan, Modes, RegisterImage
+from fan_controller.telemetry import TelemetrySampler
+from fan_controller.view import ViewController
+from inference_worker import InferenceWorker, build_speech_models
+from runtime import AsyncRuntime
+from utils import get_data_dir, log_time
+
+
+logger = logging.getLogger(__name__)
+
+
+class MainController:
+    def _build_command_decoder(self, config: dict):
+        if config["inference_worker"]:
+            inference_worker = InferenceWorker(
+                config,
+                self.commands_dir,
+                capacity=int(config["max_command_time"] * CommandRecorder.FS),
+                slots=CommandRecorder.BUFFERS
+            )
+            try:
+                with log_time("start procesu rozpoznawania"):
+                    inference_worker.wait_ready()
+            except RuntimeError:
+                inference_worker.close()
+                raise
+            acoustic_model, decoder = None, None
+        else:
+            inference_worker = None
+            acoustic_model, decoder = build_speech_models(config, self.commands_dir)
+
+        command_recorder = CommandRecorder(
+            volume_threshold=config["volume_threshold"],
+            record_wait_time=config["record_wait_time"],
+            initial_record_wait_time=config["initial_record_wait_time"],
+            max_command_time=config["max_command_time"],
+            decoder=decoder,
+            acoustic_model=acoustic_model,
+            inference_worker=inference_worker,
+            record_mode=config["record_mode"],
+            silence_time=config["silence_time"],
+            vad_threshold_db=config["vad_threshold_db"],
+            noise_floor_time=config["noise_floor_time"],
+            incremental_inference=config["incremental_inference"],
+            inference_chunk_time=config["inference_chunk_time"],
+            inference_context_time=config["inference_context_time"],
+            on_status=self.dashboard.set_status
+        )
+        return command_recorder
+
+    def load_command_recorder(self):
+        try:
+            with log_time("start rozpoznawania mowy"):
+                command_recorder = self._build_command_decoder(self.config)
+            with log_time("rozgrzewanie modelu"):
+                command_recorder.warm_up()
+            self.command_recorder = command_recorder
+        except Exception:
+            logger.exception("nie udało się uruchomić rozpoznawania mowy")
+
+    def __init__(self, config: dict, register_list: RegisterImage):
+        self.config = config
+        self.commands_dir = os.path.join(get_data_dir(), "commands")
+        self.command_registry = CommandRegistry.from_dir(self.commands_dir)
+        self.command_handlers: Dict[str, Callable] = {
+            "set": self.set_command_handler,
+            "curve": self.curve_command_handler,
+            "manual": self.manual_command_handler,
+            "exit": self.exit_command_handler
+        }
+        self.setting_actions: Dict[str, Callable[[List[Fan], Optional[float]], None]] = {
+            "speed": self.set_fans_speed,
+            "faster": self.fan_faster_speed,
+            "slower": self.fan_slower_speed,
+            "auto": self.set_fans_auto
+        }
+        self.command_recorder: Optional[CommandRecorder] = None
+        self.register_list = register_list
+        self.fans = build_fans_from_config(self.config, self.register_list)
+        self.view_controller = ViewController()
+        self.telemetry_sampler = TelemetrySampler(self.register_list, self.fans, rate=self.config["telemetry_rate"])
+        self.dashboard = Dashboard(self.view_controller, self.fans, rate=self.config["refresh_rate"])
+        self.curve_controller = CurveController(
+            self.register_list,
+            self.fans,
+            build_curves_from_config(self.config),
+            rate=self.config["control_rate"]
+        )
+        for fan_config, fan in zip(self.config["fans"], self.fans):
+            if fan_config.get("curve"):
+                self.curve_controller.set_curve(fan, fan_config["curve"])
+        self.shutdown_requested = threading.Event()
+        # spoken commands and socket batches run on separate threads, their register writes never interleave
+        self.command_lock = threading.Lock()
+        # written on shutdown to wake up a waiting manual prompt
+        self._input_cancel_read, self._input_cancel_write = os.pipe()
+
+    def get_fan(self, name: str):
+        if name == "*":
+            return self.fans
+        for fan in self.fans:
+            if fan.name == name:
+                return [fan]
+        raise RuntimeError(f"fan \"{name}\" not found!")
+
+    def set_fans_speed(self, fans: List[Fan], speed: float):
+        for fan in fans:
+            fan.set_speed(speed)
+
+    def fan_faster_speed(self, fans: List[Fan], step: float = 0.1):
+        for fan in fans:
+            fan.set_speed(min(fan.speed_level + step, 1.0))
+
+    def fan_slower_speed(self, fans: List[Fan], step: float = 0.1):
+        for fan in fans:
+            fan.set_speed(max(fan.speed_level - step, 0.0))
+
+    def set_fans_auto(self, fans: List[Fan], value: Optional[float] = None):
+        for fan in fans:
+            fan.set_mode(Modes.AUTO)
+
+    def set_command_handler(self, target: str, setting: Setting):
+        target_fan = self.get_fan(target)
+        for fan in target_fan:
+            self.curve_controller.override(fan)
+        self.setting_actions[setting.action](target_fan, setting.value)
+
+    def curve_command_handler(self, target: str, profil: str):
+        for fan in self.get_fan(target):
+            self.curve_controller.set_curve(fan, profil)
+
+    def _read_command(self) -> Optional[str]:
+        # unlike input() the wait can be cancelled, so a shutdown does not hang on the prompt
+        print("provide command", flush=True)
+        ready, _, _ = select.select([sys.stdin, self._input_cancel_read], [], [])
+        if self._input_cancel_read in ready:
+            return None
+        return sys.stdin.readline().strip() or None
+
+    def cancel_input(self):
+        os.write(self._input_cancel_write, b"\0")
+
+    def manual_command_handler(self):
+        self.dashboard.pause()
+        try:
+            command = self._read_command()
+        finally:
+            self.dashboard.resume()
+        if command is not None:
+            self.parse_command(command)
+
+    def exit_command_handler(self):
+        self.shutdown_requested.set()
+
+    def parse_command(self, command: str):
+        try:
+            parsed = self.command_registry.parse(command)
+        except ValueError as e:
+            logger.warning(f"niepoprawna komenda \"{command}\": {e}")
+            return
+        if parsed is None:
+            return
+        handler, args = parsed
+        if handler == "manual":
+            # the prompt does not hold the lock, the typed command takes it
+            self.command_handlers[handler](**args)
+            return
+        try:
+            with self.command_lock, self.register_list.batch():
+                self.command_handlers[handler](**args)
+        except OSError:
+            # unflushed writes stay dirty and go out with the next flush
+            logger.exception("błąd zapisu do EC")
+            return
+        logger.debug(f"zapisy EC: {self.register_list.write_stats}")
+
+    def main_loop(self):
+        # telemetry, control, rendering, capture and inference run as separate tasks
+        asyncio.run(AsyncRuntime(self).run())
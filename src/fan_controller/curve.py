@@ -0,0 +1,128 @@
+import logging
+from dataclasses import dataclass
+from timeit import default_timer as timer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fan_controller.fan import Fan, RegisterImage
+from fan_controller.periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PID:
+    target: float
+    kp: float
+    ki: float = 0.0
+    kd: float = 0.0
+
+
+class FanCurve:
+    @classmethod
+    def from_dict(cls, config: dict):
+        pid_config = config.get("pid")
+        return cls(
+            points=[(float(t), float(s)) for t, s in config["points"]],
+            hysteresis=config.get("hysteresis", 0.0),
+            max_rate=config.get("max_rate", 1.0),
+            pid=PID(**pid_config) if pid_config else None
+        )
+
+    def __init__(self, points: List[Tuple[float, float]], hysteresis: float = 0.0, max_rate: float = 1.0,
+                 pid: Optional[PID] = None):
+        self.points = sorted(points)
+        self.hysteresis = hysteresis
+        # maximal speed change per second
+        self.max_rate = max_rate
+        self.pid = pid
+
+    def speed_at(self, temperature: float) -> float:
+        if temperature <= self.points[0][0]:
+            return self.points[0][1]
+        for (t0, s0), (t1, s1) in zip(self.points, self.points[1:]):
+            if temperature <= t1:
+                return s0 + (s1 - s0) * (temperature - t0) / (t1 - t0)
+        return self.points[-1][1]
+
+
+class CurveState:
+    def __init__(self, curve: FanCurve, speed: float):
+        self.curve = curve
+        self.speed = speed
+        self.reference: Optional[float] = None
+        self.integral = 0.0
+        self.previous_error: Optional[float] = None
+
+    def update(self, temperature: float, dt: float) -> float:
+        curve = self.curve
+        # the curve follows rising temperature at once, falling only past the hysteresis band
+        if self.reference is None or temperature > self.reference or temperature < self.reference - curve.hysteresis:
+            self.reference = temperature
+        target = curve.speed_at(self.reference)
+        if curve.pid is not None:
+            pid = curve.pid
+            error = temperature - pid.target
+            derivative = (error - self.previous_error) / dt if self.previous_error is not None and dt > 0 else 0.0
+            self.previous_error = error
+            integral = self.integral + error * dt
+            output = target + pid.kp * error + pid.ki * integral + pid.kd * derivative
+            # anti-windup: the integral stays put while the output is saturated in the direction of the error,
+            # otherwise it keeps the fan at full speed long after the temperature drops
+            if 0.0 <= output <= 1.0 or (output > 1.0) != (error > 0):
+                self.integral = integral
+            target = output
+        max_step = curve.max_rate * dt
+        step = min(max(target - self.speed, -max_step), max_step)
+        self.speed = min(max(self.speed + step, 0.0), 1.0)
+        return self.speed
+
+
+class CurveController(PeriodicTask):
+    name = "curve"
+
+    def __init__(self, register_list: RegisterImage, fans: List[Fan], curves: Dict[str, FanCurve], rate: float,
+                 clock: Callable[[], float] = timer):
+        super().__init__(rate)
+        self.clock = clock
+        self.register_list = register_list
+        self.fans = fans
+        self.curves = curves
+        self._states: Dict[str, CurveState] = {}
+        self._levels: Dict[str, int] = {}
+        self._last_tick: Optional[float] = None
+
+    def set_curve(self, fan: Fan, curve_name: str):
+        if curve_name not in self.curves:
+            raise RuntimeError(f"curve \"{curve_name}\" not found!")
+        self._states[fan.name] = CurveState(self.curves[curve_name], fan.speed_level)
+        self._levels.pop(fan.name, None)
+        logger.info(f"{fan.name}: krzywa {curve_name}")
+
+    def override(self, fan: Fan):
+        if self._states.pop(fan.name, None) is not None:
+            logger.info(f"{fan.name}: krzywa wyłączona")
+
+    def curve_name(self, fan: Fan) -> Optional[str]:
+        state = self._states.get(fan.name)
+        if state is None:
+            return None
+        return next(name for name, curve in self.curves.items() if curve is state.curve)
+
+    def tick(self):
+        now = self.clock()
+        dt = now - self._last_tick if self._last_tick is not None else self.interval
+        self._last_tick = now
+        with self.register_list.batch():
+            for fan in self.fans:
+                state = self._states.get(fan.name)
+                if state is None or fan.state is None:
+                    continue
+                speed = state.update(fan.state.temperature, dt)
+                level = int(speed * fan.RESOLUTION)
+                if self._levels.get(fan.name) != level:
+                    fan.set_speed(speed)
+                    self._levels[fan.name] = level
+
+
+def build_curves_from_config(config: dict) -> Dict[str, FanCurve]:
+    return {name: FanCurve.from_dict(curve_config) for name, curve_config in config["curves"].items()}
@@ -0,0 +1,97 @@
+import shutil
+import sys
+import threading
+from timeit import default_timer as timer
+from typing import List, TextIO
+
+from fan_controller.fan import Fan
+from fan_controller.view import ViewController
+
+
+class Screen:
+    # anything printed outside the screen (logs, input prompts) is repaired by the periodic full redraw
+    FULL_REDRAW_INTERVAL = 5.0
+
+    def __init__(self, stream: TextIO = sys.stdout):
+        self.stream = stream
+        self._lines: List[str] = []
+        self._size = None
+        self._last_full_redraw = 0.0
+
+    def invalidate(self):
+        self._size = None
+
+    def _full_redraw(self, lines: List[str]) -> str:
+        self._last_full_redraw = timer()
+        return "\x1b[?25l\x1b[H\x1b[2J" + "\n".join(lines)
+
+    def _diff(self, lines: List[str]) -> str:
+        out = []
+        for row in range(max(len(lines), len(self._lines))):
+            line = lines[row] if row < len(lines) else ""
+            previous = self._lines[row] if row < len(self._lines) else ""
+            if line == previous:
+                continue
+            if len(line) < len(previous):
+                out.append(f"\x1b[{row + 1};{len(line) + 1}H\x1b[K")
+            first = 0
+            shortest = min(len(line), len(previous))
+            while first < shortest and line[first] == previous[first]:
+                first += 1
+            last = len(line)
+            if len(line) == len(previous):
+                while last > first and line[last - 1] == previous[last - 1]:
+                    last -= 1
+            if first < last:
+                out.append(f"\x1b[{row + 1};{first + 1}H{line[first:last]}")
+        return "".join(out)
+
+    def render(self, text: str):
+        lines = text.split("\n")
+        size = shutil.get_terminal_size()
+        if size != self._size or timer() - self._last_full_redraw > self.FULL_REDRAW_INTERVAL:
+            self._size = size
+            out = self._full_redraw(lines)
+        else:
+            out = self._diff(lines)
+        self._lines = lines
+        if out:
+            self.stream.write(out)
+            self.stream.flush()
+
+    def close(self):
+        self.stream.write(f"\x1b[{len(self._lines) + 1};1H\x1b[?25h\n")
+        self.stream.flush()
+
+
+class Dashboard:
+    def __init__(self, view_controller: ViewController, fans: List[Fan], rate: float, screen: Screen = None):
+        self.view_controller = view_controller
+        self.fans = fans
+        self.interval = 1.0 / rate
+        self.screen = screen or Screen()
+        self.status = ""
+        self.previous_command = ""
+        self._paused = threading.Event()
+
+    def set_status(self, status: str):
+        self.status = status
+
+    def set_command(self, command: str):
+        self.previous_command = command
+
+    def frame(self) -> str:
+        out = "".join(self.view_controller.get_fan_representation(fan) for fan in self.fans)
+        return out + f"{self.previous_command}\n{self.status}"
+
+    def tick(self):
+        if not self._paused.is_set():
+            self.screen.render(self.frame())
+
+    def pause(self):
+        self._paused.set()
+        self.screen.close()
+
+    def resume(self):
+        self.screen.invalidate()
+        self._paused.clear()
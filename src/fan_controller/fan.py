@@ -1,63 +1,151 @@
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from enum import Enum
-from typing import List
-from timeit import default_timer as timer
-from math import sin
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
+import numpy as np
 
-class RegisterList:
-    def _read_registers(self) -> List[str]:
-        with open(self.ec_address, "rb") as f:
-            content = f.read()
-        registers_list = content.hex('-').split('-')
-        return registers_list
+from fan_controller.history import History
+from fan_controller.snapshot import FanState
 
-    def __init__(self, ec_address: str):
-        self.ec_address = ec_address
-        self.registers = self._read_registers()
-
-    def read_register(self, address: int) -> int:
-        return int(self.registers[address], 16)
-
-    def write_register(self, value: int, address: int) -> None:
-        write_val = ('0' + hex(value).replace('0x', ''))[-2:]
-        self.registers[address] = write_val
+logger = logging.getLogger(__name__)
 
-    def write_changes(self):
-        registers_string = ' '.join(self.registers)
-        registers_bytes = bytes.fromhex(registers_string)
-        with open(self.ec_address, "wb") as f:
-            f.write(registers_bytes)
 
-    def update(self):
-        self.registers = self._read_registers()
+def address_runs(addresses: Iterable[int]) -> List[Tuple[int, int]]:
+    runs: List[Tuple[int, int]] = []
+    for address in sorted(set(addresses)):
+        if runs and runs[-1][0] + runs[-1][1] == address:
+            start, length = runs[-1]
+            runs[-1] = (start, length + 1)
+        else:
+            runs.append((address, 1))
+    return runs
 
 
-class MockRegisterList:
-    def _read_registers(self) -> List[int]:
-        return [0 for _ in range(255)]
+class RegisterImage(ABC):
+    EC_SIZE = 256
 
     def __init__(self):
-        self.registers: List[int] = self._read_registers()
+        self.registers = bytearray(self.EC_SIZE)
+        self.view = memoryview(self.registers)
+        self.dirty: Set[int] = set()
+        self._scratch = memoryview(bytearray(self.EC_SIZE))
+        self.read_runs: List[Tuple[int, int]] = [(0, self.EC_SIZE)]
+        # the telemetry sampler updates the image while commands write to it
+        self.lock = threading.RLock()
+        self._batch = threading.local()
+        self.writes_requested = 0
+        self.writes_suppressed = 0
+        self.writes_issued = 0
+        self.flushes = 0
+
+    @property
+    def write_stats(self) -> Dict[str, int]:
+        return {
+            "requested": self.writes_requested,
+            "suppressed": self.writes_suppressed,
+            "issued": self.writes_issued,
+            "flushes": self.flushes
+        }
 
     def read_register(self, address: int) -> int:
-        if address == 0:
-            t = int(255 * (sin(timer() / 10) + 1) / 2)
-            print(f"t: {t}")
-            return t
         return self.registers[address]
 
     def write_register(self, value: int, address: int) -> None:
-        self.registers[address] = value
+        value &= 0xFF
+        with self.lock:
+            self.writes_requested += 1
+            if self.registers[address] == value:
+                self.writes_suppressed += 1
+                return
+            self.registers[address] = value
+            self.dirty.add(address)
+
+    def watch(self, addresses: Iterable[int]):
+        # every EC byte read is a separate EC transaction, so only adjacent addresses are merged
+        self.read_runs = address_runs(addresses)
+
+    @contextmanager
+    def batch(self):
+        # write_changes inside a batch is deferred, the outermost batch of the thread flushes once,
+        # the lock keeps other threads from flushing or reading back half of the batch
+        with self.lock:
+            depth = getattr(self._batch, "depth", 0)
+            self._batch.depth = depth + 1
+            try:
+                yield self
+            finally:
+                self._batch.depth = depth
+                if depth == 0:
+                    self.write_changes()
+
+    @abstractmethod
+    def _flush(self, runs: List[Tuple[int, int]]):
+        pass
 
     def write_changes(self):
+        if getattr(self._batch, "depth", 0):
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            self._flush(address_runs(self.dirty))
+            self.writes_issued += len(self.dirty)
+            self.flushes += 1
+            self.dirty.clear()
+
+    @abstractmethod
+    def _read(self, start: int, out: memoryview):
         pass
 
     def update(self):
+        with self.lock:
+            for start, length in self.read_runs:
+                end = start + length
+                if not self.dirty:
+                    self._read(start, self.view[start:end])
+                    continue
+                self._read(start, self._scratch[start:end])
+                for address in range(start, end):
+                    # unflushed writes win over the EC state
+                    if address not in self.dirty:
+                        self.registers[address] = self._scratch[address]
+
+    def close(self):
         pass
 
 
+class RegisterList(RegisterImage):
+
+    def _open(self) -> int:
+        try:
+            return os.open(self.ec_address, os.O_RDWR)
+        except PermissionError:
+            logger.warning(f"{self.ec_address} opened read only, is ec_sys loaded with write_support=1?")
+            return os.open(self.ec_address, os.O_RDONLY)
+
+    def __init__(self, ec_address: str):
+        super().__init__()
+        self.ec_address = ec_address
+        self.fd = self._open()
+        self._read(0, self.view)
+
+    def _read(self, start: int, out: memoryview):
+        os.preadv(self.fd, [out], start)
+
+    def _flush(self, runs: List[Tuple[int, int]]):
+        for start, length in runs:
+            os.pwrite(self.fd, self.view[start:start + length], start)
+
+    def close(self):
+        os.close(self.fd)
+
+
 class Register:
-    def __init__(self, address: int, register_list: RegisterList):
+    def __init__(self, address: int, register_list: RegisterImage):
         self.address = address
         self.register_list = register_list
 
@@ -80,7 +168,7 @@ class Modes(Enum):
 
 
 class ModeRegister(Register):
-    def __init__(self, address: int, register_list: RegisterList, manual_value: int, auto_value: int) -> None:
+    def __init__(self, address: int, register_list: RegisterImage, manual_value: int, auto_value: int) -> None:
         super().__init__(address, register_list)
         self.manual_value: int = manual_value
         self.auto_value = auto_value
@@ -100,7 +188,7 @@ class ModeRegister(Register):
 
 
 class FanRegister(Register):
-    def __init__(self, address: int, register_list: RegisterList, min: int, max: int) -> None:
+    def __init__(self, address: int, register_list: RegisterImage, min: int, max: int) -> None:
         super().__init__(address, register_list)
         self.min: int = min
         self.max: int = max
@@ -110,7 +198,7 @@ class Fan:
     RESOLUTION = 50
 
     @classmethod
-    def from_dict(cls, config: dict, register_list: RegisterList, max_temp: int):
+    def from_dict(cls, config: dict, register_list: RegisterImage, max_temp: int):
         name = config["name"]
         mode_configs = config["mode"]
         mode_registers = []
@@ -170,15 +258,16 @@ class Fan:
         self._read_list: List[FanRegister] = fan_read_registers
         self._write_list: List[FanRegister] = fan_write_registers
         self._temp: FanRegister = temperature_register
+        # linear maps are fixed by the config, so their coefficients are computed once
+        self._read_maps = [(r.min, self.RESOLUTION / (r.max - r.min)) for r in fan_read_registers]
+        self._write_maps = [(w.min, (w.max - w.min) / self.RESOLUTION) for w in fan_write_registers]
+        self.state: Optional[FanState] = None
         self._history_len = 500
-        self._read_history: List[List[int]] = [[] for _ in self._read_list]
-        self._temperature_history: List[int] = []
-
-    def map_value(self, value, range_min, range_max):
-        return int(((value - range_min) / (range_max - range_min)) * self.RESOLUTION)
+        self._create_histories()
 
-    def unmap_value(self, value, range_min, range_max):
-        return int(((value * (range_max - range_min)) / self.RESOLUTION) + range_min)
+    def _create_histories(self):
+        # channel 0 holds the temperature, the next ones the read registers
+        self.history = History(self._history_len, channels=1 + len(self._read_list))
 
     @property
     def modes(self):
@@ -196,45 +285,57 @@ class Fan:
     def temperature_register(self):
         return self._temp
 
+    @property
+    def addresses(self) -> List[int]:
+        registers = self._mode + self._read_list + self._write_list + [self._temp]
+        return [register.address for register in registers]
+
     @property
     def history_length(self):
-        return self.history_length
+        return self._history_len
 
     @history_length.setter
     def history_length(self, length: int):
         self._history_len = length
+        self._create_histories()
 
     def read_temperature(self):
         return self._temp.read()
 
-    @property
-    def temperature_history(self):
-        temperature = self.read_temperature()
-        self._temperature_history.append(temperature)
-        index = len(self._temperature_history) - self._history_len if len(self._temperature_history) > self._history_len else 0
-        self._temperature_history = self._temperature_history[index:]
-        return self._temperature_history
-
     def read_speeds(self):
         speeds = [r.read() for r in self._read_list]
         return speeds
 
-    @property
-    def read_history(self):
+    def _decode_speeds(self, speeds: List[int]) -> Tuple[float, ...]:
+        return tuple(
+            int((value - range_min) * scale) / self.RESOLUTION
+            for value, (range_min, scale) in zip(speeds, self._read_maps)
+        )
+
+    def sample(self, timestamp: float) -> FanState:
+        temperature = self.read_temperature()
         speeds = self.read_speeds()
-        for i, hist in enumerate(self._read_history):
-            hist.append(speeds[i])
-            index = len(hist) - self._history_len if len(hist) > self._history_len else 0
-            hist = hist[index:]
-            self._read_history[i] = hist
-        return self._read_history
+        self.history.append(timestamp, [temperature] + speeds)
+        self.state = FanState(temperature, self._decode_speeds(speeds))
+        return self.state
+
+    @property
+    def history_timestamps(self) -> np.ndarray:
+        return self.history.timestamps()
+
+    @property
+    def temperature_history(self) -> np.ndarray:
+        return self.history.values(0)
+
+    @property
+    def read_history(self) -> List[np.ndarray]:
+        return [self.history.values(i + 1) for i in range(len(self._read_list))]
 
     def set_speed(self, speed: float):
         speed = int(speed * self.RESOLUTION)
-        for i, write in enumerate(self._write_list):
+        for i, (write, (range_min, scale)) in enumerate(zip(self._write_list, self._write_maps)):
             self._mode[i].set_mode(Modes.MANUAL)
-            unmapped_speed = self.unmap_value(speed, write.min, write.max)
-            write.write(unmapped_speed)
+            write.write(int(speed * scale + range_min))
 
     def set_mode(self, mode: Modes):
         for mode_r in self._mode:
@@ -242,15 +343,15 @@ class Fan:
 
     @property
     def speed_level(self):
-        speeds = self.read_speeds()
-        mapped_speeds = []
-        for i, read in enumerate(self._read_list):
-            mapped_speeds.append(float(self.map_value(speeds[i], read.min, read.max)) / self.RESOLUTION)
-        return sum(mapped_speeds)/len(mapped_speeds)
+        # the last telemetry sample, the registers are read only before the first one
+        if self.state is None:
+            return FanState(self.read_temperature(), self._decode_speeds(self.read_speeds())).speed_level
+        return self.state.speed_level
 
 
-def build_fans_from_config(config: dict, register_list: RegisterList) -> List[Fan]:
+def build_fans_from_config(config: dict, register_list: RegisterImage) -> List[Fan]:
     fan_configs = config["fans"]
     max_temp = int(config["max_temp"])
     fan_list: List[Fan] = [Fan.from_dict(fan_config, register_list, max_temp) for fan_config in fan_configs]
+    register_list.watch(address for fan in fan_list for address in fan.addresses)
     return fan_list
@@ -0,0 +1,64 @@
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class History:
+    # every sample is stored twice, capacity apart, so the latest n samples are always one contiguous slice
+    def __init__(self, capacity: int, channels: int = 1):
+        self.capacity = capacity
+        self.channels = channels
+        self._timestamps = np.zeros(2 * capacity, dtype=np.float64)
+        self._values = np.zeros((2 * capacity, channels), dtype=np.float32)
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, timestamp: float, values: Sequence[float]):
+        index = self._next
+        self._timestamps[index] = self._timestamps[index + self.capacity] = timestamp
+        self._values[index] = self._values[index + self.capacity] = values
+        self._next = (index + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def _window(self, length: Optional[int]) -> slice:
+        length = self._size if length is None else min(length, self._size)
+        end = self._next + self.capacity
+        return slice(end - length, end)
+
+    def timestamps(self, length: Optional[int] = None) -> np.ndarray:
+        view = self._timestamps[self._window(length)]
+        view.flags.writeable = False
+        return view
+
+    def values(self, channel: int, length: Optional[int] = None) -> np.ndarray:
+        view = self._values[self._window(length), channel]
+        view.flags.writeable = False
+        return view
+
+    def window(self, length: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        window = self._window(length)
+        timestamps, values = self._timestamps[window], self._values[window]
+        timestamps.flags.writeable = False
+        values.flags.writeable = False
+        return timestamps, values
+
+    def downsample(self, buckets: int, channel: int, length: Optional[int] = None
+                   ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # returns bucket start timestamps with min, max and mean of each bucket
+        timestamps = self.timestamps(length)
+        values = self.values(channel, length)
+        if len(values) == 0:
+            empty = np.zeros(0, dtype=np.float32)
+            return np.zeros(0, dtype=np.float64), empty, empty, empty
+        buckets = min(buckets, len(values))
+        edges = np.linspace(0, len(values), buckets + 1).astype(np.intp)[:-1]
+        counts = np.diff(np.append(edges, len(values)))
+        return (
+            timestamps[edges],
+            np.minimum.reduceat(values, edges),
+            np.maximum.reduceat(values, edges),
+            np.add.reduceat(values, edges) / counts
+        )
@@ -0,0 +1,13 @@
+from abc import ABC, abstractmethod
+
+
+class PeriodicTask(ABC):
+    # scheduled by the runtime every interval seconds
+    name = "periodic"
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+
+    @abstractmethod
+    def tick(self):
+        pass
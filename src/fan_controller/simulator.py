@@ -0,0 +1,115 @@
+import errno
+import random
+import time
+from math import exp, pi, sin
+from timeit import default_timer as timer
+from typing import Callable, List, Optional, Tuple
+
+from fan_controller.fan import RegisterImage
+
+
+def _duty(value: int, range_min: int, range_max: int) -> float:
+    return min(max((value - range_min) / (range_max - range_min), 0.0), 1.0)
+
+
+class SimulatedFan:
+    def __init__(self, config: dict, simulation: dict, rng: random.Random):
+        self.name = config["name"]
+        self.modes = [(m["register"], m["manual"]) for m in config["mode"]]
+        self.writes = [(w["register"], w["min"], w["max"]) for w in config["write"]]
+        self.reads = [(r["register"], r["min"], r["max"]) for r in config["read"]]
+        self.temp_address = config["temp"]
+        self.ambient = simulation.get("ambient", 30.0)
+        # heat capacity in J/°C and conductance in W/°C without and with full airflow
+        self.heat_capacity = simulation.get("heat_capacity", 30.0)
+        self.conductance = simulation.get("conductance", 1.0)
+        self.fan_conductance = simulation.get("fan_conductance", 2.0)
+        self.load = simulation.get("load", [30.0, 70.0])
+        self.load_period = simulation.get("load_period", 120.0)
+        self.fan_lag = simulation.get("fan_lag", 2.0)
+        self.noise = simulation.get("noise", 0.3)
+        self.rng = rng
+        self.phase = rng.uniform(0, 2 * pi)
+        self.temperature = self.ambient + self.load[0] / self.conductance
+        self.speeds = [0.0] * len(self.reads)
+
+    def heat(self, t: float) -> float:
+        low, high = self.load
+        return low + (high - low) * (sin(2 * pi * t / self.load_period + self.phase) + 1) / 2
+
+    def duties(self, ec: bytearray) -> List[float]:
+        duties = []
+        for i, (address, range_min, range_max) in enumerate(self.writes):
+            mode_address, manual = self.modes[min(i, len(self.modes) - 1)]
+            if ec[mode_address] == manual:
+                duties.append(_duty(ec[address], range_min, range_max))
+            else:
+                # the EC's own curve in automatic mode
+                duties.append(min(max((self.temperature - 50.0) / 40.0, 0.2), 1.0))
+        return duties
+
+    def step(self, ec: bytearray, t: float, dt: float):
+        duties = self.duties(ec)
+        lag = exp(-dt / self.fan_lag)
+        for i in range(len(self.speeds)):
+            duty = duties[i] if i < len(duties) else sum(duties) / len(duties)
+            self.speeds[i] = duty + (self.speeds[i] - duty) * lag
+        airflow = sum(self.speeds) / len(self.speeds)
+        # exact solution for constant heat and airflow, stable for any dt
+        conductance = self.conductance + self.fan_conductance * airflow
+        equilibrium = self.ambient + self.heat(t) / conductance
+        self.temperature = equilibrium + (self.temperature - equilibrium) * exp(-conductance * dt / self.heat_capacity)
+        temperature = self.temperature + self.rng.gauss(0.0, self.noise)
+        ec[self.temp_address] = min(max(int(round(temperature)), 0), 255)
+        for speed, (address, range_min, range_max) in zip(self.speeds, self.reads):
+            ec[address] = int(round(range_min + speed * (range_max - range_min)))
+
+
+class MockRegisterList(RegisterImage):
+    # simulated EC behind the same byte image interface as RegisterList
+    def __init__(self, config: dict, clock: Callable[[], float] = timer):
+        super().__init__()
+        self.clock = clock
+        simulation = config.get("simulation", {})
+        self.rng = random.Random(simulation.get("seed"))
+        self.fans = [SimulatedFan(fan_config, simulation, self.rng) for fan_config in config["fans"]]
+        # simulated seconds per real second, higher values speed up soak tests
+        self.time_scale = simulation.get("time_scale", 1.0)
+        # seconds per EC byte and probability of a failed EC transaction
+        self.latency = simulation.get("latency", 0.0)
+        self.error_rate = simulation.get("error_rate", 0.0)
+        self.errors = 0
+        self.ec = bytearray(self.EC_SIZE)
+        self.time = 0.0
+        self._last_update: Optional[float] = None
+        self.step(0.0)
+        self.registers[:] = self.ec
+
+    def step(self, dt: float):
+        self.time += dt
+        for fan in self.fans:
+            fan.step(self.ec, self.time, dt)
+
+    def _transaction(self, length: int):
+        if self.latency:
+            time.sleep(self.latency * length)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise OSError(errno.EIO, "simulated EC error")
+
+    def _flush(self, runs: List[Tuple[int, int]]):
+        for start, length in runs:
+            self._transaction(length)
+            self.ec[start:start + length] = self.view[start:start + length]
+
+    def _read(self, start: int, out: memoryview):
+        self._transaction(len(out))
+        out[:] = self.ec[start:start + len(out)]
+
+    def update(self):
+        now = self.clock()
+        dt = 0.0 if self._last_update is None else (now - self._last_update) * self.time_scale
+        self._last_update = now
+        with self.lock:
+            self.step(dt)
+            super().update()
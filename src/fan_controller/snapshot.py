@@ -0,0 +1,22 @@
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class FanState:
+    temperature: int
+    # read registers mapped to 0-1, quantized to Fan.RESOLUTION
+    speeds: Tuple[float, ...]
+
+    @property
+    def speed_level(self) -> float:
+        return sum(self.speeds) / len(self.speeds)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    timestamp: float
+    fans: Dict[str, FanState]
+
+    def get(self, fan_name: str) -> Optional[FanState]:
+        return self.fans.get(fan_name)
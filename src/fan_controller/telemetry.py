@@ -0,0 +1,22 @@
+from timeit import default_timer as timer
+from typing import Callable, List, Optional
+
+from fan_controller.fan import Fan, RegisterImage
+from fan_controller.periodic import PeriodicTask
+from fan_controller.snapshot import Snapshot
+
+
+class TelemetrySampler(PeriodicTask):
+    name = "telemetry"
+
+    def __init__(self, register_list: RegisterImage, fans: List[Fan], rate: float, clock: Callable[[], float] = timer):
+        super().__init__(rate)
+        self.clock = clock
+        self.register_list = register_list
+        self.fans = fans
+        self.snapshot: Optional[Snapshot] = None
+
+    def tick(self):
+        self.register_list.update()
+        timestamp = self.clock()
+        self.snapshot = Snapshot(timestamp, {fan.name: fan.sample(timestamp) for fan in self.fans})
@@ -1,60 +1,64 @@
-from typing import List
+import shutil
+from typing import Optional
 
-from fan_controller.fan import Fan
+from fan_controller.fan import Fan, FanRegister
 
 import numpy as np
 
 
 class ViewController:
+    GLYPHS = [" ", "▁", "▂", "▃", "▄", "▅", "▆", "▇", "█"]
+    # code points of the glyphs, rows are built as uint32 arrays and reinterpreted as strings
+    GLYPH_CODES = np.array([ord(glyph) for glyph in GLYPHS], dtype=np.uint32)
 
-    @staticmethod
-    def represent_value(val: int, resolution: int):
-        values = {
-            'filler': '█',
-            'empty': ' ',
-            0: " ",
-            1: "▁",
-            2: "▂",
-            3: "▃",
-            4: "▄",
-            5: "▅",
-            6: "▆",
-            7: "▇",
-            8: "█",
-        }
-        values_len = len(values) - 2
-        max_multiplier = int(resolution / values_len)
-        multiplier = int(val / values_len)
-        residual = val % values_len
-        base = multiplier * [values["filler"]]
-        out = (max_multiplier - multiplier) * [values['empty']] + [values[residual]] + base
-        return out
+    def __init__(self, width: Optional[int] = None):
+        self.width = width
+
+    @property
+    def columns(self) -> int:
+        if self.width is not None:
+            return self.width
+        return shutil.get_terminal_size().columns
 
     def serialize_history(self, history, range_min, range_max, resolution):
-        mapped = [int(((val - range_min) / (range_max - range_min)) * resolution) for val in history]
-        represented = np.array([self.represent_value(val, resolution) for val in mapped])
-        represented = np.transpose(represented)
-        out = ""
-        for i in represented:
-            out += ''.join(i)
-            out += '\n'
-        return out
+        # a cell spans len(GLYPHS) units, its top glyph shows the remainder
+        steps = len(self.GLYPHS)
+        rows = int(resolution / steps) + 1
+        history = np.asarray(history, dtype=np.float64)
+        if len(history) == 0:
+            return "\n" * rows
+        mapped = ((history - range_min) / (range_max - range_min) * resolution).astype(np.int32)
+        np.clip(mapped, 0, resolution, out=mapped)
+        levels = np.arange(rows - 1, -1, -1, dtype=np.int32)[:, None] * steps
+        glyph_indices = np.clip(mapped[None, :] - levels, 0, steps - 1)
+        codes = np.ascontiguousarray(self.GLYPH_CODES[glyph_indices])
+        lines = codes.view(f"<U{len(history)}")[:, 0]
+        return "\n".join(lines.tolist()) + "\n"
+
+    def _fit(self, fan: Fan, channel: int, register: FanRegister):
+        # downsample to the terminal width keeping the peaks visible,
+        # an inverted register (min > max) peaks at its lowest raw value
+        if len(fan.history) <= self.columns:
+            return fan.history.values(channel)
+        _, lows, highs, _ = fan.history.downsample(self.columns, channel)
+        return lows if register.min > register.max else highs
 
     def get_fan_representation(self, fan: Fan):
-        out = f"{fan.name}\n" \
+        state = fan.state
+        header = fan.name if state is None else f"{fan.name} {state.temperature}° {state.speed_level:.0%}"
+        out = f"{header}\n" \
               f"temperature:\n"
         temp_graph = self.serialize_history(
-            fan.temperature_history,
+            self._fit(fan, 0, fan.temperature_register),
             fan.temperature_register.min,
             fan.temperature_register.max,
             fan.RESOLUTION
         )
         out += temp_graph + "\n"
-        read_histories = fan.read_history
         for i, read_register in enumerate(fan.read_registers):
             out += f"fan {i+1}:\n"
             register_graph = self.serialize_history(
-                read_histories[i],
+                self._fit(fan, i + 1, read_register),
                 read_register.min,
                 read_register.max,
                 fan.RESOLUTION
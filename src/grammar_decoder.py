@@ -0,0 +1,126 @@
+import logging
+import math
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+NEG_INF = float("-inf")
+
+
+def _logaddexp(a: float, b: float) -> float:
+    if a == NEG_INF:
+        return b
+    if b == NEG_INF:
+        return a
+    if a < b:
+        a, b = b, a
+    return a + math.log1p(math.exp(b - a))
+
+
+class CommandGrammar:
+    ROOT = 0
+
+    def __init__(self):
+        self.arcs: List[Dict[str, int]] = [{}]
+        self.labels: List[str] = [""]
+        self.final: Set[int] = set()
+
+    def _add_state(self, label: str) -> int:
+        self.arcs.append({})
+        self.labels.append(label)
+        return len(self.arcs) - 1
+
+    def _add_word(self, state: int, word: str) -> int:
+        for char in word:
+            if char not in self.arcs[state]:
+                self.arcs[state][char] = self._add_state(char)
+            state = self.arcs[state][char]
+        return state
+
+    def add_command(self, slots: List[List[str]]):
+        # slots[0] holds the command name, the next ones the values of its arguments
+        ends = {self.ROOT}
+        for i, values in enumerate(slots):
+            entry = self.ROOT
+            if i > 0:
+                entry = self._add_state(" ")
+                for end in ends:
+                    if " " in self.arcs[end]:
+                        raise RuntimeError(f"ambiguous grammar after \"{' '.join(slots[0])}\"!")
+                    self.arcs[end][" "] = entry
+            ends = {self._add_word(entry, value) for value in values}
+        self.final.update(ends)
+
+    def __len__(self):
+        return len(self.arcs)
+
+
+class GrammarDecoder:
+    def __init__(self, grammar: CommandGrammar, tokens: List[str], blank_id: int, beam_width: int = 32,
+                 min_confidence: float = 0.0):
+        self.grammar = grammar
+        self.blank_id = blank_id
+        self.beam_width = beam_width
+        self.min_confidence = min_confidence
+        token_ids = {token: i for i, token in enumerate(tokens)}
+        self.space_id = token_ids[" "]
+        state_tokens = [-1]
+        for label in grammar.labels[1:]:
+            if label not in token_ids:
+                raise RuntimeError(f"\"{label}\" not in model vocabulary!")
+            state_tokens.append(token_ids[label])
+        self.state_tokens = state_tokens
+        # leading/trailing word delimiters are not part of any command, score them like blanks
+        self.edge_states = grammar.final | {CommandGrammar.ROOT}
+
+    def decode_with_confidence(self, logits: np.ndarray) -> Tuple[str, float]:
+        log_probs = logits - np.logaddexp.reduce(logits, axis=1, keepdims=True)
+        arcs = self.grammar.arcs
+        state_tokens = self.state_tokens
+        # prefix text -> [state, log p ending in blank, log p ending in label]
+        beams: Dict[str, list] = {"": [CommandGrammar.ROOT, 0.0, NEG_INF]}
+        for frame in log_probs.tolist():
+            next_beams: Dict[str, list] = {}
+            for text, (state, p_blank, p_label) in beams.items():
+                total = _logaddexp(p_blank, p_label)
+                blank = frame[self.blank_id]
+                if state in self.edge_states:
+                    blank = _logaddexp(blank, frame[self.space_id])
+                beam = next_beams.setdefault(text, [state, NEG_INF, NEG_INF])
+                beam[1] = _logaddexp(beam[1], total + blank)
+                token = state_tokens[state]
+                if token >= 0:
+                    beam[2] = _logaddexp(beam[2], p_label + frame[token])
+                for char, next_state in arcs[state].items():
+                    next_token = state_tokens[next_state]
+                    previous = p_blank if next_token == token else total
+                    next_beam = next_beams.setdefault(text + char, [next_state, NEG_INF, NEG_INF])
+                    next_beam[2] = _logaddexp(next_beam[2], previous + frame[next_token])
+            if len(next_beams) > self.beam_width:
+                ranked = sorted(next_beams.items(), key=lambda b: _logaddexp(b[1][1], b[1][2]), reverse=True)
+                next_beams = dict(ranked[:self.beam_width])
+            beams = next_beams
+        scores = {text: _logaddexp(p_blank, p_label) for text, (_, p_blank, p_label) in beams.items()}
+        finals = [text for text, (state, _, _) in beams.items() if state in self.grammar.final]
+        if not finals:
+            return "", 0.0
+        best = max(finals, key=lambda text: scores[text])
+        total = NEG_INF
+        for score in scores.values():
+            total = _logaddexp(total, score)
+        confidence = math.exp(scores[best] - total)
+        logger.info(f"komenda: \"{best}\" pewność: {confidence:.2f}")
+        return best, confidence
+
+    def decode_scored(self, logits: np.ndarray) -> Tuple[str, float]:
+        # text is empty below min_confidence, the confidence is kept for reporting
+        text, confidence = self.decode_with_confidence(logits)
+        if confidence < self.min_confidence:
+            return "", confidence
+        return text, confidence
+
+    def decode(self, logits: np.ndarray) -> str:
+        return self.decode_scored(logits)[0]
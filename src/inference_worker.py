@@ -0,0 +1,233 @@
+import logging
+import multiprocessing
+import os
+import threading
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+from timeit import default_timer
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from chunked_inference import ChunkedLogits
+from utils import configure_logging, get_data_dir, get_models_dir, log_time
+
+logger = logging.getLogger(__name__)
+
+
+def build_language(language_decoder_builder):
+    if not language_decoder_builder.language_is_current():
+        language_decoder_builder.build_language()
+
+
+def build_speech_models(config: dict, commands_dir: str):
+    # torch and the decoders are imported here, so a process using the worker never loads them
+    from acoustic_model import build_acoustic_model
+    from language_decoder_builder import LanguageDecoderBuilder, DecoderTypes
+
+    with log_time("ładowanie modelu"):
+        acoustic_model = build_acoustic_model(
+            model_name=config["model_name"],
+            backend=config["model_backend"],
+            models_dir=get_models_dir(),
+            threads=config["inference_threads"]
+        )
+    logger.info("models created!")
+
+    language_decoder_builder = LanguageDecoderBuilder(
+        commands_dir=commands_dir,
+        language_dir=os.path.join(get_data_dir(), "language"),
+        alpha=config["decoder_alpha"],
+        beta=config["decoder_beta"]
+    )
+
+    if config["decoder"] == DecoderTypes.GRAMMAR:
+        with log_time("budowanie gramatyki"):
+            decoder = language_decoder_builder.build_grammar_decoder(
+                acoustic_model.tokenizer,
+                min_confidence=config["grammar_min_confidence"]
+            )
+    else:
+        with log_time("budowanie języka"):
+            build_language(language_decoder_builder)
+
+        with log_time("budowanie dekodera"):
+            decoder = language_decoder_builder.build_decoder(acoustic_model.tokenizer)
+    return acoustic_model, decoder
+
+
+def warm_up(acoustic_model, decoder):
+    # first pass pays for lazy init and allocator growth, keep it off the first real command
+    decoder.decode(acoustic_model.logits(np.zeros(acoustic_model.fs, dtype=np.float32)))
+
+
+def _serve(config: dict, commands_dir: str, shm_name: str, slots: int, capacity: int, conn: Connection):
+    configure_logging()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    audio = np.ndarray((slots, capacity), dtype=np.float32, buffer=shm.buf)
+    try:
+        try:
+            acoustic_model, decoder = build_speech_models(config, commands_dir)
+            warm_up(acoustic_model, decoder)
+        except Exception as e:
+            logger.exception("nie udało się uruchomić rozpoznawania mowy")
+            conn.send(("error", repr(e)))
+            return
+        chunks = None
+        if config["incremental_inference"]:
+            chunks = [
+                ChunkedLogits.for_model(acoustic_model, config["inference_chunk_time"], config["inference_context_time"])
+                for _ in range(slots)
+            ]
+        conn.send(("ready", None))
+        while True:
+            request = conn.recv()
+            if request is None:
+                break
+            kind, slot, length = request
+            # the audio is read in place from the shared block
+            if kind == "reset":
+                if chunks:
+                    chunks[slot].reset()
+                continue
+            if kind == "feed":
+                # the slot is still being recorded, only its first length samples are final
+                if chunks:
+                    try:
+                        chunks[slot].feed(audio[slot, :length])
+                    except Exception:
+                        logger.exception("błąd rozpoznawania fragmentu")
+                        chunks[slot].reset()
+                continue
+            try:
+                start = default_timer()
+                if chunks:
+                    # the windows not fed yet, or all of them after a restart
+                    chunks[slot].feed(audio[slot, :length], final=True)
+                    logits = chunks[slot].logits()
+                else:
+                    logits = acoustic_model.logits(audio[slot, :length])
+                model_done = default_timer()
+                sent = decoder.decode(logits)
+                timings = {"model": model_done - start, "decoder": default_timer() - model_done}
+                conn.send(("ok", (sent, timings)))
+            except Exception as e:
+                logger.exception("błąd rozpoznawania")
+                conn.send(("error", repr(e)))
+    finally:
+        del audio
+        shm.close()
+
+
+class InferenceWorker:
+    # acoustic model and decoder live in a separate process, the recorder captures straight into
+    # slots of one shared memory block, so only the slot and length cross the pipe
+    def __init__(self, config: dict, commands_dir: str, capacity: int, slots: int = 1):
+        self.config = config
+        self.commands_dir = commands_dir
+        self.capacity = capacity
+        self.slots = slots
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * capacity * np.dtype(np.float32).itemsize)
+        self.audio = np.ndarray((slots, capacity), dtype=np.float32, buffer=self.shm.buf)
+        # _lock serializes requests and restarts, _send_lock only the pipe writes,
+        # so the capture thread can feed chunks while a transcription waits for its answer
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._closed = False
+        self._start()
+
+    def _start(self):
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_serve,
+            args=(self.config, self.commands_dir, self.shm.name, self.slots, self.capacity, child_conn),
+            name="inference",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def _stop(self, timeout: Optional[float]):
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+    def _restart(self):
+        self._stop(timeout=1.0)
+        self._conn.close()
+        logger.warning(f"proces rozpoznawania zakończył się (kod {self.process.exitcode}), uruchamianie ponownie")
+        self._start()
+        with log_time("start procesu rozpoznawania"):
+            self.wait_ready()
+
+    def _receive(self):
+        status, payload = self._conn.recv()
+        if status == "error":
+            raise RuntimeError(f"inference worker: {payload}")
+        return payload
+
+    def wait_ready(self):
+        try:
+            self._receive()
+        except EOFError:
+            raise RuntimeError("inference worker exited")
+
+    def slot(self, index: int) -> np.ndarray:
+        return self.audio[index]
+
+    def _send(self, request):
+        with self._send_lock:
+            self._conn.send(request)
+
+    def _post(self, request):
+        # chunk requests have no answer, a dead process is restarted by the next transcribe
+        if self._closed:
+            return
+        try:
+            self._send(request)
+        except OSError:
+            pass
+
+    def reset(self, slot: int):
+        self._post(("reset", slot, 0))
+
+    def feed(self, slot: int, length: int):
+        self._post(("feed", slot, min(length, self.capacity)))
+
+    def transcribe(self, slot: int, length: int) -> Tuple[str, Dict[str, float]]:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("inference worker closed")
+            if not self.process.is_alive():
+                self._restart()
+            start = default_timer()
+            try:
+                self._send(("transcribe", slot, min(length, self.capacity)))
+                sent, timings = self._receive()
+            except (EOFError, OSError):
+                if self._closed:
+                    raise RuntimeError("inference worker closed")
+                # the command that was being recognized is lost, the next one gets a new process
+                self._restart()
+                raise RuntimeError("inference worker exited, restarted")
+            timings["total"] = default_timer() - start
+        return sent, timings
+
+    def close(self, timeout: Optional[float] = 5.0):
+        # a transcription still running ends with EOFError and sees the flag instead of restarting
+        self._closed = True
+        try:
+            self._send(None)
+        except OSError:
+            pass
+        self._stop(timeout)
+        with self._lock:
+            self._conn.close()
+        del self.audio
+        self.shm.close()
+        self.shm.unlink()
@@ -1,103 +1,208 @@
+import hashlib
+import itertools
+import json
 import os.path
+import shutil
 import subprocess
-import time
-from dataclasses import dataclass
-import time
-from typing import List
-from pyctcdecode import build_ctcdecoder
+from typing import Dict, Iterable, Iterator, List
+from pyctcdecode import build_ctcdecoder, BeamSearchDecoderCTC
 from transformers import Wav2Vec2CTCTokenizer
 import logging
 
+from command_registry import Command, read_arg_values, read_commands
+from grammar_decoder import CommandGrammar, GrammarDecoder
+from ngram_model import WittenBellLanguageModel
+
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
-class Command:
-    name: str
-    args: List[str]
+class DecoderTypes:
+    BEAM = "beam"
+    GRAMMAR = "grammar"
+
+
+class BuildManifest:
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+
+    def is_current(self, artifact: str, digest: str, paths: List[str]) -> bool:
+        return self.entries.get(artifact) == digest and all(os.path.exists(path) for path in paths)
+
+    def update(self, artifact: str, digest: str):
+        self.entries[artifact] = digest
+        with open(self.path, "w") as f:
+            json.dump(self.entries, f, indent=4)
 
 
 class LanguageDecoderBuilder:
+    ORDER = 3
+
     def __init__(
             self,
             commands_dir: str,
-            language_dir: str
+            language_dir: str,
+            alpha: float = 2.0,
+            beta: float = -1.0
     ):
         self.commands_dir = commands_dir
         self.language_text_path = os.path.join(language_dir, "language.txt")
         self.language_model_path = os.path.join(language_dir, "language.arpa")
+        self.language_binary_path = os.path.join(language_dir, "language.bin")
+        self.decoder_dir = os.path.join(language_dir, "decoder")
+        self.manifest = BuildManifest(os.path.join(language_dir, "manifest.json"))
+        self.alpha = alpha
+        self.beta = beta
+        self._arg_values: Dict[str, List[str]] = {}
+        self._language_digest = None
+
+    def _get_input_paths(self) -> List[str]:
+        arg_names = sorted({arg for command in self._get_commands() for arg in command.args})
+        return [os.path.join(self.commands_dir, "commands.txt")] + \
+            [os.path.join(self.commands_dir, arg_name) + ".txt" for arg_name in arg_names]
+
+    def language_digest(self) -> str:
+        if self._language_digest is None:
+            digest = hashlib.sha256(f"order={self.ORDER}".encode())
+            for path in self._get_input_paths():
+                digest.update(os.path.basename(path).encode())
+                with open(path, "rb") as f:
+                    digest.update(hashlib.sha256(f.read()).digest())
+            self._language_digest = digest.hexdigest()
+        return self._language_digest
+
+    def _decoder_digest(self, tokens: List[str]) -> str:
+        parameters = json.dumps({
+            "language": self.language_digest(),
+            "tokens": tokens,
+            "alpha": self.alpha,
+            "beta": self.beta
+        })
+        return hashlib.sha256(parameters.encode()).hexdigest()
+
+    def language_is_current(self) -> bool:
+        return self.manifest.is_current(
+            "language",
+            self.language_digest(),
+            [self.language_text_path, self.language_model_path]
+        )
 
     def _get_arg_values(self, arg_name: str) -> List[str]:
-        path = os.path.join(self.commands_dir, arg_name) + ".txt"
-        with open(path, "r") as f:
-            lines = f.readlines()
-        arg_values = [line.strip() for line in lines]
-        return arg_values
+        if arg_name not in self._arg_values:
+            self._arg_values[arg_name] = read_arg_values(self.commands_dir, arg_name)
+        return self._arg_values[arg_name]
 
     def _get_commands(self) -> List[Command]:
-        path = os.path.join(self.commands_dir, "commands.txt")
-        with open(path, "r") as f:
-            lines = f.readlines()
-        commands: List[Command] = []
-        for line in lines:
-            line = line.strip()
-            command_words_list = line.split(" ")
-            name = command_words_list[0]
-            args = command_words_list[1:]
-            commands.append(Command(name, args))
-        return commands
-
-    def _generate_possible_commands(self, command_list: List[Command]) -> List[str]:
-        possible_commands: List[str] = []
+        return read_commands(self.commands_dir)
+
+    def _generate_possible_commands(self, command_list: List[Command]) -> Iterator[str]:
         for command in command_list:
-            list_of_command_possibilities: List[str] = [command.name]
-            for arg in command.args:
-                arg_values = self._get_arg_values(arg)
-                list_of_arg_possibilities: List[str] = []
-                for arg_value in arg_values:
-                    for possibility in list_of_command_possibilities:
-                        list_of_arg_possibilities.append(" ".join([possibility, arg_value]))
-                list_of_command_possibilities = list_of_arg_possibilities
-            possible_commands += list_of_command_possibilities
-        return possible_commands
-
-    def _save_language_text(self, possible_commands: List[str]):
+            # the first argument varies fastest
+            arg_values = [self._get_arg_values(arg) for arg in reversed(command.args)]
+            for combination in itertools.product(*arg_values):
+                yield " ".join([command.name, *reversed(combination)])
+
+    def _save_language_text(self, possible_commands: Iterable[str]) -> Iterator[str]:
         with open(self.language_text_path, "w") as f:
-            f.writelines([f"{l}\n" for l in possible_commands])
+            for possible_command in possible_commands:
+                f.write(f"{possible_command}\n")
+                yield possible_command
 
-    def _generate_model_file(self):
+    def _generate_model_file(self, possible_commands: Iterable[str]):
+        language_model = WittenBellLanguageModel(order=self.ORDER)
+        language_model.add_text(possible_commands)
+        language_model.estimate()
+        language_model.write_arpa(self.language_model_path)
+
+    def _generate_binary_file(self):
+        # KenLM binary is memory mapped on load instead of parsing the ARPA text
+        if shutil.which("build_binary") is None:
+            logger.info("build_binary not found, decoder will load the ARPA file")
+            return
         completed_process = subprocess.run([
-            "ngram-count",
-            "-text",
-            self.language_text_path,
-            "-order",
-            "3",
-            "-wbdiscount",
-            "-unk",
-            "-lm",
-            self.language_model_path
+            "build_binary",
+            self.language_model_path,
+            self.language_binary_path
         ])
         if completed_process.returncode != 0:
             raise RuntimeError(completed_process.stderr)
 
+    def _get_kenlm_model_path(self) -> str:
+        if not self.manifest.is_current("binary", self.language_digest(), [self.language_binary_path]):
+            self._generate_binary_file()
+            if os.path.exists(self.language_binary_path):
+                self.manifest.update("binary", self.language_digest())
+        if os.path.exists(self.language_binary_path):
+            return self.language_binary_path
+        return self.language_model_path
+
+    def _get_unigrams(self) -> List[str]:
+        # a KenLM binary does not list its vocabulary, pyctcdecode needs it explicitly
+        words = set()
+        for command in self._get_commands():
+            words.add(command.name)
+            for arg in command.args:
+                for value in self._get_arg_values(arg):
+                    words.update(value.split())
+        return sorted(words)
+
     def _build_decoder(self, tokens: List[str]):
+        digest = self._decoder_digest(tokens)
+        if self.manifest.is_current("decoder", digest, [self.decoder_dir]):
+            logger.info("loading decoder")
+            return BeamSearchDecoderCTC.load_from_dir(self.decoder_dir)
         logger.info("building decoder")
-        decoder = build_ctcdecoder(tokens, self.language_model_path, alpha=2.0, beta=-1.0)
+        decoder = build_ctcdecoder(
+            tokens,
+            self._get_kenlm_model_path(),
+            unigrams=self._get_unigrams(),
+            alpha=self.alpha,
+            beta=self.beta
+        )
+        if os.path.exists(self.decoder_dir):
+            shutil.rmtree(self.decoder_dir)
+        decoder.save_to_dir(self.decoder_dir)
+        self.manifest.update("decoder", digest)
         logger.info("done building decoder!")
-        time.sleep(1)
-        logger.info("done sleeping after building decoder!")
         return decoder
 
     def build_language(self):
         commands = self._get_commands()
         possible_commands = self._generate_possible_commands(commands)
-        self._save_language_text(possible_commands)
-        self._generate_model_file()
+        self._generate_model_file(self._save_language_text(possible_commands))
+        self.manifest.update("language", self.language_digest())
 
-    def build_decoder(self, tokenizer: Wav2Vec2CTCTokenizer):
-        logger.info("updating tokens")
+    @staticmethod
+    def _get_tokens(tokenizer: Wav2Vec2CTCTokenizer) -> List[str]:
         tokens = [x[0] for x in sorted(tokenizer.get_vocab().items(), key=lambda x: x[1])]
         tokens[tokens.index('|')] = " "
+        return tokens
+
+    def build_decoder(self, tokenizer: Wav2Vec2CTCTokenizer):
+        logger.info("updating tokens")
+        tokens = self._get_tokens(tokenizer)
         decoder = self._build_decoder(tokens)
         return decoder
+
+    def build_grammar(self) -> CommandGrammar:
+        grammar = CommandGrammar()
+        for command in self._get_commands():
+            slots = [[command.name]] + [self._get_arg_values(arg) for arg in command.args]
+            grammar.add_command(slots)
+        return grammar
+
+    def build_grammar_decoder(self, tokenizer: Wav2Vec2CTCTokenizer, min_confidence: float) -> GrammarDecoder:
+        logger.info("building grammar decoder")
+        grammar = self.build_grammar()
+        decoder = GrammarDecoder(
+            grammar,
+            self._get_tokens(tokenizer),
+            blank_id=tokenizer.pad_token_id,
+            min_confidence=min_confidence
+        )
+        logger.info(f"done building grammar decoder! {len(grammar)} states")
+        return decoder
@@ -0,0 +1,54 @@
+import json
+import logging
+import os
+
+from transformers import Wav2Vec2Processor, Wav2Vec2ForCTC
+
+logger = logging.getLogger(__name__)
+
+
+BUNDLE_VERSION = 1
+
+
+class ModelBundle:
+    def __init__(self, models_dir: str, model_name: str):
+        self.model_name = model_name
+        self.path = os.path.join(models_dir, f"{model_name.replace('/', '--')}-v{BUNDLE_VERSION}")
+        self.manifest_path = os.path.join(self.path, "bundle.json")
+
+    def _read_manifest(self) -> dict:
+        with open(self.manifest_path, "r") as f:
+            return json.load(f)
+
+    def exists(self) -> bool:
+        if not os.path.exists(self.manifest_path):
+            return False
+        manifest = self._read_manifest()
+        return manifest.get("version") == BUNDLE_VERSION and manifest.get("model_name") == self.model_name
+
+    def save(self, processor: Wav2Vec2Processor, model: Wav2Vec2ForCTC):
+        logger.info(f"saving model bundle to {self.path}")
+        os.makedirs(self.path, exist_ok=True)
+        processor.save_pretrained(self.path)
+        # safetensors weights are memory mapped by from_pretrained
+        model.save_pretrained(self.path, safe_serialization=True)
+        with open(self.manifest_path, "w") as f:
+            json.dump({"version": BUNDLE_VERSION, "model_name": self.model_name}, f)
+
+    def load_processor(self) -> Wav2Vec2Processor:
+        return Wav2Vec2Processor.from_pretrained(self.path, local_files_only=True)
+
+    def load_model(self) -> Wav2Vec2ForCTC:
+        return Wav2Vec2ForCTC.from_pretrained(self.path, local_files_only=True)
+
+
+def load_pretrained(model_name: str, models_dir: str, load_model: bool = True):
+    bundle = ModelBundle(models_dir, model_name)
+    if bundle.exists():
+        processor = bundle.load_processor()
+        model = bundle.load_model() if load_model else None
+        return processor, model
+    processor = Wav2Vec2Processor.from_pretrained(model_name)
+    model = Wav2Vec2ForCTC.from_pretrained(model_name)
+    bundle.save(processor, model)
+    return processor, model
@@ -0,0 +1,112 @@
+import logging
+import math
+import struct
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+NGram = Tuple[str, ...]
+
+
+class WittenBellLanguageModel:
+    # mirrors `ngram-count -wbdiscount -unk` with SRILM's default minimal counts
+    SENTENCE_START = "<s>"
+    SENTENCE_END = "</s>"
+    UNKNOWN = "<unk>"
+
+    def __init__(self, order: int = 3):
+        self.order = order
+        self.counts: List[Dict[NGram, int]] = [defaultdict(int) for _ in range(order)]
+        self.probs: List[Dict[NGram, float]] = [{} for _ in range(order)]
+        self.bows: Dict[NGram, float] = {}
+
+    @staticmethod
+    def min_count(n: int) -> int:
+        return 1 if n <= 2 else 2
+
+    def add_sentence(self, words: List[str]):
+        tokens = [self.SENTENCE_START] + words + [self.SENTENCE_END]
+        for n in range(1, self.order + 1):
+            counts = self.counts[n - 1]
+            for i in range(len(tokens) - n + 1):
+                ngram = tuple(tokens[i:i + n])
+                if ngram != (self.SENTENCE_START,):
+                    counts[ngram] += 1
+
+    def add_text(self, lines: Iterable[str]):
+        for line in lines:
+            words = line.split()
+            if words:
+                self.add_sentence(words)
+
+    def prob(self, word: str, context: NGram) -> float:
+        ngram = context + (word,)
+        explicit = self.probs[len(context)].get(ngram)
+        if explicit is not None:
+            return explicit
+        if not context:
+            return self.probs[0].get((self.UNKNOWN,), 0.0)
+        return self.bows.get(context, 1.0) * self.prob(word, context[1:])
+
+    def _estimate_unigrams(self):
+        counts = self.counts[0]
+        total = sum(counts.values())
+        observed = len(counts)
+        probs = {ngram: count / (total + observed) for ngram, count in counts.items()}
+        if (self.UNKNOWN,) not in probs:
+            probs[(self.UNKNOWN,)] = observed / (total + observed)
+        probs[(self.SENTENCE_START,)] = 0.0
+        self.probs[0] = probs
+
+    def _estimate_order(self, n: int):
+        counts = self.counts[n - 1]
+        totals: Dict[NGram, int] = defaultdict(int)
+        observed: Dict[NGram, int] = defaultdict(int)
+        for ngram, count in counts.items():
+            totals[ngram[:-1]] += count
+            observed[ngram[:-1]] += 1
+        min_count = self.min_count(n)
+        probs = {}
+        for ngram, count in counts.items():
+            if count >= min_count:
+                context = ngram[:-1]
+                probs[ngram] = count / (totals[context] + observed[context])
+        self.probs[n - 1] = probs
+
+        seen: Dict[NGram, List[NGram]] = defaultdict(list)
+        for ngram in probs:
+            seen[ngram[:-1]].append(ngram)
+        for context, ngrams in seen.items():
+            numerator = 1.0 - sum(probs[ngram] for ngram in ngrams)
+            denominator = 1.0 - sum(self.prob(ngram[-1], context[1:]) for ngram in ngrams)
+            self.bows[context] = numerator / denominator if denominator > 0 else 1.0
+
+    def estimate(self):
+        self._estimate_unigrams()
+        for n in range(2, self.order + 1):
+            self._estimate_order(n)
+
+    @staticmethod
+    def _format_log(value: float) -> str:
+        if value <= 0:
+            return "-99"
+        # SRILM keeps log probabilities as 32-bit floats
+        log_value = struct.unpack("f", struct.pack("f", math.log10(value)))[0]
+        return f"{log_value:.7g}"
+
+    def write_arpa(self, path: str):
+        with open(path, "w") as f:
+            f.write("\n\\data\\\n")
+            for n in range(1, self.order + 1):
+                f.write(f"ngram {n}={len(self.probs[n - 1])}\n")
+            for n in range(1, self.order + 1):
+                f.write(f"\n\\{n}-grams:\n")
+                for ngram in sorted(self.probs[n - 1]):
+                    line = f"{self._format_log(self.probs[n - 1][ngram])}\t{' '.join(ngram)}"
+                    if n < self.order and ngram in self.bows:
+                        line += f"\t{self._format_log(self.bows[ngram])}"
+                    f.write(line + "\n")
+            f.write("\n\\end\\\n")
+        logger.info(f"saved {path}")
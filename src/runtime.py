@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer as timer
+from typing import Awaitable, Callable, List, Optional
+
+from command_recorder import CommandRecorder, Utterance
+from command_server import CommandServer
+from fan_controller.periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRuntime:
+    # a full utterance queue stops capture until inference catches up, commands queue behind EC writes,
+    # the recorder buffers hold the queued utterances besides the recorded and the recognized one
+    UTTERANCE_QUEUE_SIZE = CommandRecorder.BUFFERS - 2
+    COMMAND_QUEUE_SIZE = 4
+    # wait before opening the input device again, e.g. after it was unplugged
+    CAPTURE_RETRY_DELAY = 1.0
+
+    def __init__(self, controller):
+        self.controller = controller
+        # EC I/O, audio capture, inference and commands block, each gets its own threads so none can stall the others
+        self.io_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ec")
+        self.capture_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="capture")
+        self.inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        # the manual command handler may wait on the prompt for a long time
+        self.command_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="command")
+        self.socket_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="socket")
+        self.utterances: "asyncio.Queue[Utterance]" = asyncio.Queue(self.UTTERANCE_QUEUE_SIZE)
+        self.commands: "asyncio.Queue[str]" = asyncio.Queue(self.COMMAND_QUEUE_SIZE)
+        self._stopping = asyncio.Event()
+        self.command_server: Optional[CommandServer] = None
+
+    def stop(self):
+        self._stopping.set()
+
+    async def _every(self, interval: float, name: str, tick: Callable[[], Awaitable[None]]):
+        next_tick = timer()
+        while True:
+            try:
+                await tick()
+            except OSError:
+                logger.exception(f"{name}: błąd dostępu do EC")
+            except Exception:
+                logger.exception(f"{name}: błąd")
+            next_tick += interval
+            delay = next_tick - timer()
+            if delay < 0:
+                # fell behind, skip the missed ticks instead of bursting
+                next_tick = timer()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def _periodic(self, task: PeriodicTask):
+        loop = asyncio.get_running_loop()
+
+        async def tick():
+            await loop.run_in_executor(self.io_executor, task.tick)
+
+        return self._every(task.interval, task.name, tick)
+
+    def _render(self):
+        dashboard = self.controller.dashboard
+
+        async def tick():
+            dashboard.tick()
+
+        return self._every(dashboard.interval, "dashboard", tick)
+
+    async def _capture(self):
+        loop = asyncio.get_running_loop()
+        controller = self.controller
+        controller.dashboard.set_status("ładowanie rozpoznawania mowy...")
+        await loop.run_in_executor(self.inference_executor, controller.load_command_recorder)
+        recorder = controller.command_recorder
+        if recorder is None:
+            controller.dashboard.set_status("rozpoznawanie mowy niedostępne")
+            return
+        while True:
+            try:
+                utterance = await loop.run_in_executor(self.capture_executor, recorder.capture)
+            except Exception:
+                logger.exception("błąd nagrywania")
+                await asyncio.sleep(self.CAPTURE_RETRY_DELAY)
+                continue
+            if utterance.audio.size == 0:
+                continue
+            await self.utterances.put(utterance)
+
+    async def _infer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            utterance = await self.utterances.get()
+            try:
+                command = await loop.run_in_executor(
+                    self.inference_executor, self.controller.command_recorder.transcribe, utterance
+                )
+            except Exception:
+                logger.exception("błąd rozpoznawania")
+                continue
+            await self.commands.put(command)
+
+    async def _execute(self):
+        loop = asyncio.get_running_loop()
+        controller = self.controller
+        while True:
+            command = await self.commands.get()
+            controller.dashboard.set_command(command)
+            try:
+                await loop.run_in_executor(self.command_executor, controller.parse_command, command)
+            except Exception:
+                logger.exception(f"błąd komendy \"{command}\"")
+            if controller.shutdown_requested.is_set():
+                self.stop()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+        controller = self.controller
+        tasks: List[asyncio.Task] = [
+            asyncio.create_task(coroutine) for coroutine in (
+                self._periodic(controller.telemetry_sampler),
+                self._periodic(controller.curve_controller),
+                self._render(),
+                self._capture(),
+                self._infer(),
+                self._execute()
+            )
+        ]
+        try:
+            if controller.config["command_socket"]:
+                # a failed bind still goes through the shutdown below, the EC and the worker are cleaned up
+                self.command_server = CommandServer(
+                    controller, controller.config["command_socket"], self.socket_executor, on_exit=self.stop
+                )
+                await self.command_server.start()
+            await self._stopping.wait()
+        finally:
+            await self._shutdown(tasks)
+
+    async def _shutdown(self, tasks: List[asyncio.Task]):
+        controller = self.controller
+        if controller.command_recorder is not None:
+            controller.command_recorder.cancel()
+        controller.cancel_input()
+        if self.command_server is not None:
+            await self.command_server.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # capture ends at the next audio frame and a manual prompt returns at once,
+        # a running inference is left to finish on its own
+        self.capture_executor.shutdown(wait=True)
+        self.inference_executor.shutdown(wait=False, cancel_futures=True)
+        self.command_executor.shutdown(wait=True, cancel_futures=True)
+        self.socket_executor.shutdown(wait=True, cancel_futures=True)
+        self.io_executor.shutdown(wait=True)
+        if controller.command_recorder is not None:
+            controller.command_recorder.close()
+        controller.dashboard.screen.close()
+        try:
+            controller.register_list.write_changes()
+        except OSError:
+            logger.exception("błąd zapisu do EC")
+        controller.register_list.close()
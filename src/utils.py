@@ -1,6 +1,16 @@
 import json
+import logging
 import os
 import subprocess
+from contextlib import contextmanager
+from timeit import default_timer
+
+logger = logging.getLogger(__name__)
+
+
+def configure_logging():
+    # shared by every entry point, LOG_LEVEL=DEBUG shows e.g. the EC write statistics
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"), force=True)
 
 
 def get_root_dir():
@@ -11,13 +21,24 @@ def get_data_dir():
     return os.path.join(get_root_dir(), "data")
 
 
+def get_models_dir():
+    return os.path.join(get_data_dir(), "models")
+
+
 def enable_ec_write_access():
     subprocess.run(["sudo", "modprobe", "-r", "ec_sys"])
     subprocess.run(["sudo", "modprobe", "ec_sys", "write_support=1"])
 
 
-def get_config() -> dict:
-    config_path = os.path.join(get_data_dir(), "config.json")
+def get_config(config_name: str = "config.json") -> dict:
+    config_path = os.path.join(get_data_dir(), config_name)
     with open(config_path, "r") as f:
         config = json.load(f)
     return config
+
+
+@contextmanager
+def log_time(phase: str):
+    start = default_timer()
+    yield
+    logger.info(f"{phase}: {(default_timer() - start):.2f}s")
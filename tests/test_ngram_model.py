@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ngram_model import WittenBellLanguageModel  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def test_matches_srilm(tmp_path):
+    # srilm_language.arpa: `ngram-count -order 3 -wbdiscount -unk -text srilm_language.txt`
+    language_model = WittenBellLanguageModel(order=3)
+    with open(os.path.join(DATA_DIR, "srilm_language.txt"), "r", encoding="utf-8") as f:
+        language_model.add_text(f)
+    language_model.estimate()
+    path = tmp_path / "language.arpa"
+    language_model.write_arpa(str(path))
+    with open(os.path.join(DATA_DIR, "srilm_language.arpa"), "rb") as f:
+        expected = f.read()
+    assert path.read_bytes() == expected
@@ -0,0 +1,43 @@
+import os
+import sys
+import threading
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from fan_controller.fan import RegisterImage  # noqa: E402
+
+
+class RecordingImage(RegisterImage):
+    def __init__(self):
+        super().__init__()
+        self.flushed: List[List[Tuple[int, int]]] = []
+
+    def _read(self, start: int, out: memoryview):
+        pass
+
+    def _flush(self, runs: List[Tuple[int, int]]):
+        self.flushed.append(runs)
+
+
+def test_batch_is_one_flush_across_threads():
+    # the curve controller flushes from its own thread while a command is half written
+    image = RecordingImage()
+    with image.batch():
+        image.write_register(1, 10)
+        other = threading.Thread(target=image.write_changes)
+        other.start()
+        other.join(0.1)
+        image.write_register(2, 11)
+    other.join()
+    assert image.flushed == [[(10, 2)]]
+    assert image.write_stats["flushes"] == 1
+
+
+def test_unchanged_writes_are_suppressed():
+    image = RecordingImage()
+    with image.batch():
+        image.write_register(0, 10)
+        image.write_register(5, 12)
+    assert image.flushed == [[(12, 1)]]
+    assert image.write_stats == {"requested": 2, "suppressed": 1, "issued": 1, "flushes": 1}